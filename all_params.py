@@ -119,6 +119,43 @@ dist_parm_dict = {
     "wrapcauchy":       ["c", "loc", "scale"]
 }
 
+
+#######################################################
+# Prior fit cost in seconds per 1000 observations, used by the fit planner
+# until measured runs are recorded (cost_registry.py). Distributions not
+# listed use default_fit_cost.
+default_fit_cost = 0.02
+
+dist_cost_prior = {
+    "gausshyper":       1.0,
+    "genexpon":         0.2,
+    "kappa4":           0.3,
+    "ksone":            0.5,
+    "kstwo":            2.0,
+    "levy_stable":      5.0,
+    "ncf":              0.5,
+    "nct":              0.3,
+    "ncx2":             0.2,
+    "norminvgauss":     0.1,
+    "vonmises":         0.1,
+}
+
+
+#######################################################
+# Named distribution subsets for batch fitting ("common" and "all" are
+# resolved separately from fitter's common set and dist_list)
+dist_subsets = {
+    "positive":     ['burr', 'burr12', 'chi', 'chi2', 'expon', 'exponweib', 'fatiguelife', 'fisk',
+                     'gamma', 'gengamma', 'invgamma', 'invgauss', 'loglaplace', 'lognorm', 'lomax',
+                     'maxwell', 'nakagami', 'rayleigh', 'wald', 'weibull_min'],
+    "heavy_tailed": ['burr', 'cauchy', 'fisk', 'genextreme', 'genpareto', 'halfcauchy', 'invgamma',
+                     'johnsonsu', 'levy', 'lomax', 'pareto', 't'],
+    "symmetric":    ['cauchy', 'dgamma', 'dweibull', 'gennorm', 'hypsecant', 'laplace', 'logistic',
+                     'norm', 't', 'uniform'],
+    "bounded":      ['anglit', 'arcsine', 'beta', 'bradford', 'cosine', 'powerlaw', 'reciprocal',
+                     'semicircular', 'triang', 'truncexpon', 'truncnorm', 'uniform'],
+}
+
 ########################################################
 # Removing this three from dictionary due to issues
 #    "rv_continuous":    ["None"],
@@ -0,0 +1,179 @@
+# Headless batch fitting
+#
+# Fits a distribution set to columns of many CSV files with the same engine
+# the Streamlit app uses, and writes the ranked summaries with named
+# parameters as CSV, JSON or Parquet. Distributions deferred by the fit
+# planner get an unranked row with the reason in the error column and are
+# listed on stderr.
+#
+#   python batch_fit.py data/*.csv --columns speed wait_time --dists common \
+#       --bins 100 --method aic --output results.csv --jobs 4
+#
+# Python API:
+#   from batch_fit import fit_file, fit_files, write_results
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from data_cache import file_digest
+from export import write_file
+from fit_engine import DEFAULT_TIMEOUT, DEFAULT_WORKERS, MultiColumnFitter, resolve_distributions
+from result_cache import ResultCache
+from cost_registry import CostRegistry
+from tracing import NULL_TRACER, Tracer
+
+
+METHODS = ["sumsquare_error", "aic", "bic"]
+DEFERRED_PREFIX = "deferred: "
+
+
+# Fit every requested (or every numeric) column of one CSV file
+def fit_file(path, distributions, columns = None, bins = 100, method = "sumsquare_error",
+             timeout = DEFAULT_TIMEOUT, max_workers = DEFAULT_WORKERS, cache = None,
+             registry = None, budget = None, warm_start = True, tracer = None):
+    tracer = tracer if tracer is not None else NULL_TRACER
+    with tracer.phase("read_csv", file = path):
+        with open(path, "rb") as fh:
+            digest = file_digest(fh)
+        df = pd.read_csv(path, usecols = columns)
+    if columns is None:
+        columns = df.select_dtypes("number").columns.to_list()
+
+    f = MultiColumnFitter({col: df[col].values for col in columns}, distributions,
+                          bins = bins, timeout = timeout, max_workers = max_workers,
+                          cache = cache, digest = digest, registry = registry,
+                          warm_start = warm_start, tracer = tracer)
+    with tracer.phase("fit", file = path):
+        results = f.plan(budget).fit().results(method)
+    # Distributions the planner deferred (over budget, repeatedly failing or
+    # nothing to fit) are listed unranked with their reason
+    deferred = pd.DataFrame([{"column": col, "dist_name": name, "error": DEFERRED_PREFIX + reason}
+                             for (col, name), reason in f.deferred.items()])
+    if len(deferred):
+        results = pd.concat([results, deferred], ignore_index = True, sort = False)
+    results.insert(0, "file", path)
+    return results
+
+
+# fit_file, with a file that cannot be read or fitted (missing column, parse
+# error, ...) recorded as one row with its error instead of stopping the batch
+def _fit_file_or_error(path, *args):
+    try:
+        return fit_file(path, *args)
+    except Exception as e:
+        return pd.DataFrame([{"file": path, "error": repr(e)}])
+
+
+# Fit several files at once. Each file gets its own process pool, so the
+# total number of worker processes is split between the files in flight.
+# Files that fail get a single row with their error.
+def fit_files(paths, distributions, columns = None, bins = 100, method = "sumsquare_error",
+              timeout = DEFAULT_TIMEOUT, jobs = 1, max_workers = DEFAULT_WORKERS, cache = None,
+              registry = None, budget = None, warm_start = True, tracer = None):
+    jobs = max(1, min(jobs, len(paths)))
+    per_file = max(1, max_workers // jobs)
+    with ThreadPoolExecutor(jobs) as executor:
+        frames = list(executor.map(
+            lambda path: _fit_file_or_error(path, distributions, columns, bins, method, timeout,
+                                            per_file, cache, registry, budget, warm_start, tracer),
+            paths))
+    return pd.concat(frames, ignore_index = True) if frames else pd.DataFrame()
+
+
+# {file: error} for the files that could not be fitted at all
+def failed_files(results):
+    if "dist_name" not in results.columns:
+        rows = results
+    else:
+        rows = results[results["dist_name"].isna()]
+    return dict(zip(rows["file"], rows["error"])) if len(rows) else {}
+
+
+# {(file, column): {distribution: reason}} for the fits the planner deferred
+def deferred_fits(results):
+    if "error" not in results.columns:
+        return {}
+    rows = results[results["error"].str.startswith(DEFERRED_PREFIX, na = False)]
+    deferred = {}
+    for path, col, name, error in zip(rows["file"], rows["column"], rows["dist_name"], rows["error"]):
+        deferred.setdefault((path, col), {})[name] = error[len(DEFERRED_PREFIX):]
+    return deferred
+
+
+# Best distribution per (file, column)
+def best_per_column(results):
+    if "rank" not in results.columns:
+        return results.iloc[0:0]
+    return results[results["rank"] == 1].reset_index(drop = True)
+
+
+# The format is taken from the file extension
+def write_results(results, path):
+    write_file(results, path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description = "Fit distributions to columns of CSV files")
+    parser.add_argument("files", nargs = "+", help = "CSV files to fit")
+    parser.add_argument("--columns", nargs = "+", default = None,
+                        help = "columns to fit (default: every numeric column)")
+    parser.add_argument("--dists", default = "common",
+                        help = "'common', 'all', a named subset from all_params.dist_subsets "
+                               "or a comma separated list of distributions")
+    parser.add_argument("--bins", type = int, default = 100)
+    parser.add_argument("--method", choices = METHODS, default = "sumsquare_error")
+    parser.add_argument("--timeout", type = float, default = DEFAULT_TIMEOUT,
+                        help = "per-distribution time budget in seconds")
+    parser.add_argument("--budget", type = float, default = None,
+                        help = "per-file time budget in seconds; slow or failing distributions "
+                               "are deferred by the fit planner")
+    parser.add_argument("--jobs", type = int, default = 1, help = "files fitted in parallel")
+    parser.add_argument("--workers", type = int, default = DEFAULT_WORKERS,
+                        help = "total worker processes")
+    parser.add_argument("--output", default = "dist_summary.csv",
+                        help = "summary table (.csv, .json or .parquet)")
+    parser.add_argument("--best-output", default = None,
+                        help = "optional table with only the best distribution per column")
+    parser.add_argument("--no-warm-start", action = "store_true",
+                        help = "start every fit from scipy's default initial values")
+    parser.add_argument("--no-cache", action = "store_true", help = "do not use the fit cache")
+    parser.add_argument("--trace", default = None,
+                        help = "write per-phase and per-distribution timings as a Chrome trace "
+                               "JSON file")
+    return parser
+
+
+def main(argv = None):
+    args = build_parser().parse_args(argv)
+    try:
+        distributions = resolve_distributions(args.dists)
+    except ValueError as e:
+        print(e, file = sys.stderr)
+        return 2
+
+    cache = None if args.no_cache else ResultCache()
+    tracer = Tracer(enabled = args.trace is not None)
+    results = fit_files(args.files, distributions, args.columns, args.bins, args.method,
+                        args.timeout, args.jobs, args.workers, cache, CostRegistry(), args.budget,
+                        not args.no_warm_start, tracer)
+    with tracer.phase("write results"):
+        write_results(results, args.output)
+        if args.best_output:
+            write_results(best_per_column(results), args.best_output)
+    if args.trace:
+        tracer.write(args.trace)
+    print("Wrote {} rows for {} file(s) to {}".format(len(results), len(args.files), args.output))
+    for (path, col), names in deferred_fits(results).items():
+        print("Deferred in {} column {}: {}".format(
+            path, col, ", ".join("{} ({})".format(k, v) for k, v in sorted(names.items()))),
+            file = sys.stderr)
+    failed = failed_files(results)
+    for path, error in failed.items():
+        print("Failed: {}: {}".format(path, error), file = sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+# Fitting benchmarks
+#
+# Generates synthetic datasets from several dist_list families and measures
+#   * per-distribution fit time (common set, one process, no pool)
+#   * full pipeline time for the common set and for the full dist_list
+#   * peak RSS of each case and of its worker processes
+#   * the data-path cost of a rerun after a widget change: cached upload
+#     read, cached fits re-scored with a new bin count, summary plot
+# Every case runs in a freshly spawned interpreter so peak RSS is per case.
+# Results are written as JSON, one file per run, and two runs can be
+# compared with --compare.
+#
+#   python benchmarks/bench_fitting.py --sizes 1000 100000 10000000
+#   python benchmarks/bench_fitting.py --compare old.json new.json
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from queue import Empty
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+import scipy
+import scipy.stats
+
+
+FAMILIES = {
+    "norm": (),
+    "gamma": (2.0,),
+    "lognorm": (0.6,),
+    "weibull_min": (1.5,),
+    "genextreme": (-0.1,),
+}
+DEFAULT_SIZES = [1000, 10000, 100000]
+FULL_SET_MAX_ROWS = 10000
+
+
+def make_data(family, size, seed = 0):
+    dist = getattr(scipy.stats, family)
+    return dist.rvs(*FAMILIES[family], loc = 1.0, scale = 2.0, size = size,
+                    random_state = np.random.RandomState(seed))
+
+
+# Peak resident set size in MB of this process and of its largest child
+def peak_rss():
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return self_kb / scale, child_kb / scale
+
+
+def case_per_distribution(family, size, timeout):
+    from fit_engine import _fit_task, resolve_distributions
+    data = make_data(family, size)
+    times = {}
+    for name in resolve_distributions("common"):
+        _, _, params, elapsed, error, _ = _fit_task((None, name, data, timeout, None))
+        times[name] = None if error else elapsed
+    return {"seconds": sum(t for t in times.values() if t is not None), "fit_time": times}
+
+
+def case_pipeline(family, size, timeout, dist_set, workers):
+    from fit_engine import ParallelFitter, resolve_distributions
+    data = make_data(family, size)
+    start = time.time()
+    f = ParallelFitter(data, resolve_distributions(dist_set), timeout = timeout,
+                       max_workers = workers).fit()
+    elapsed = time.time() - start
+    return {"seconds": elapsed, "fitted": len(f.fitted_param), "failed": len(f.fit_error),
+            "compressed": f.is_compressed}
+
+
+def case_rerun(family, size, timeout, workers):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import data_cache
+    import result_cache
+    from fit_engine import ParallelFitter, resolve_distributions
+
+    cache_dir = tempfile.mkdtemp(prefix = "bench_cache_")
+    data_cache.DATA_CACHE_DIR = os.path.join(cache_dir, "data")
+    fit_cache = result_cache.ResultCache(os.path.join(cache_dir, "fits.sqlite"))
+    upload = io.BytesIO()
+    pd.DataFrame({"value": make_data(family, size)}).to_csv(upload, index = False)
+    dists = resolve_distributions("common")
+
+    # The first Process click pays for parsing and fitting
+    start = time.time()
+    digest, df = data_cache.read_csv_cached(upload)
+    ParallelFitter(df["value"].values, dists, bins = 100, timeout = timeout, max_workers = workers,
+                   cache = fit_cache, cache_key = (digest, "value")).fit()
+    cold = time.time() - start
+
+    # Rerun after changing the bin count: everything is served from caches
+    start = time.time()
+    digest, df = data_cache.read_csv_cached(upload)
+    f = ParallelFitter(df["value"].values, dists, bins = 50, timeout = timeout, max_workers = workers,
+                       cache = fit_cache, cache_key = (digest, "value")).fit()
+    fig, ax = plt.subplots()
+    f.summary(Nbest = 5, method = "aic")
+    plt.close(fig)
+    rerun = time.time() - start
+    shutil.rmtree(cache_dir, ignore_errors = True)
+    return {"cold_seconds": cold, "rerun_seconds": rerun, "cached": len(f.cached)}
+
+
+CASES = {
+    "per_distribution": case_per_distribution,
+    "pipeline": case_pipeline,
+    "rerun": case_rerun,
+}
+
+
+def _run_case(queue, name, args):
+    try:
+        result = CASES[name](*args)
+    except Exception as e:
+        result = {"error": repr(e)}
+    result["peak_rss_mb"], result["peak_child_rss_mb"] = peak_rss()
+    queue.put(result)
+
+
+# Run a case in a fresh interpreter. A case that raises or whose process dies
+# (e.g. killed for running out of memory) is recorded with an error instead
+# of stopping the run.
+def run_isolated(name, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target = _run_case, args = (queue, name, args))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout = 1)
+            break
+        except Empty:
+            if not process.is_alive():
+                try:
+                    result = queue.get(timeout = 1)
+                except Empty:
+                    result = {"error": "process exited with code {}".format(process.exitcode)}
+                break
+    process.join()
+    if "error" in result:
+        print("{} {}: {}".format(name, args[:2], result["error"]), file = sys.stderr)
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = ROOT,
+                                         stderr = subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "scipy": scipy.__version__, "pandas": pd.__version__,
+            "cpus": os.cpu_count(), "platform": platform.platform()}
+
+
+def run(sizes, families, timeout, workers, full_set_max_rows):
+    results = []
+    for family in families:
+        for size in sizes:
+            print("{} n={}".format(family, size), file = sys.stderr)
+            base = {"family": family, "rows": size}
+            results.append(dict(base, case = "per_distribution",
+                                **run_isolated("per_distribution", family, size, timeout)))
+            results.append(dict(base, case = "pipeline_common",
+                                **run_isolated("pipeline", family, size, timeout, "common", workers)))
+            if size <= full_set_max_rows:
+                results.append(dict(base, case = "pipeline_all",
+                                    **run_isolated("pipeline", family, size, timeout, "all", workers)))
+            results.append(dict(base, case = "rerun",
+                                **run_isolated("rerun", family, size, timeout, workers)))
+    return {"environment": environment(),
+            "settings": {"timeout": timeout, "workers": workers},
+            "results": results}
+
+
+# Headline timings of two result files side by side
+def compare(old_path, new_path):
+    def headline(path):
+        with open(path) as fh:
+            report = json.load(fh)
+        rows = {}
+        for r in report["results"]:
+            for metric in ("seconds", "rerun_seconds", "peak_rss_mb"):
+                if metric in r:
+                    rows[(r["case"], r["family"], r["rows"], metric)] = r[metric]
+        return report["environment"].get("commit"), rows
+
+    old_commit, old = headline(old_path)
+    new_commit, new = headline(new_path)
+    frame = pd.DataFrame({"old": pd.Series(old), "new": pd.Series(new)})
+    frame.index.names = ["case", "family", "rows", "metric"]
+    frame["ratio"] = frame["new"] / frame["old"]
+    print("old: {}  new: {}".format(old_commit, new_commit))
+    print(frame.to_string())
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Distribution fitting benchmarks")
+    parser.add_argument("--sizes", nargs = "+", type = int, default = DEFAULT_SIZES,
+                        help = "rows per synthetic dataset (up to 1e7)")
+    parser.add_argument("--families", nargs = "+", default = list(FAMILIES),
+                        choices = list(FAMILIES))
+    parser.add_argument("--timeout", type = float, default = 30)
+    parser.add_argument("--workers", type = int, default = os.cpu_count() or 1)
+    parser.add_argument("--full-set-max-rows", type = int, default = FULL_SET_MAX_ROWS,
+                        help = "largest dataset fitted with the full dist_list")
+    parser.add_argument("--output", default = None,
+                        help = "result file (default: bench_results/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare", nargs = 2, metavar = ("OLD", "NEW"),
+                        help = "compare two result files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    report = run(args.sizes, args.families, args.timeout, args.workers, args.full_set_max_rows)
+    output = args.output
+    if output is None:
+        commit = (report["environment"]["commit"] or "nogit")[:10]
+        output = os.path.join(ROOT, "bench_results",
+                              "{}_{}.json".format(time.strftime("%Y%m%d-%H%M%S"), commit))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent = 2, default = float)
+    print("Wrote {}".format(output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+# One-pass descriptive statistics with a mergeable quantile sketch
+#
+# ColumnStats reads a column one chunk at a time and keeps count, min/max,
+# and the central moments needed for mean, variance, skewness and kurtosis
+# (merged with Pebay's pairwise update formulas, so chunks and partial
+# results combine exactly). Quantiles come from QuantileSketch, a
+# logarithmic bucket histogram with a relative accuracy guarantee (as in
+# DDSketch) that merges by adding bucket counts. Nothing is sorted, memory
+# does not grow with the number of rows, and the same code serves in-memory
+# frames and files streamed in chunks. Results are cached per uploaded file
+# digest and column, in memory and as JSON under the cache directory; the
+# least recently used files are removed beyond FIT_STATS_FILES.
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data_cache import CACHE_DIR
+
+
+STATS_DIR = os.path.join(CACHE_DIR, "stats")
+# Relative error of sketch quantiles
+RELATIVE_ACCURACY = 0.01
+# Magnitudes below this are counted as zero
+MIN_MAGNITUDE = 1e-12
+# Rows per update when summarising an in-memory column
+CHUNK_ROWS = 1000000
+# (digest, column) entries kept in memory
+MEMO_SIZE = 256
+# Stats files (one per uploaded file) kept on disk
+STATS_FILES_KEPT = int(os.environ.get("FIT_STATS_FILES", 1000))
+
+
+class QuantileSketch(object):
+
+    def __init__(self, relative_accuracy = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def _add(self, buckets, magnitudes):
+        index, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                  return_counts = True)
+        for i, c in zip(index.tolist(), counts.tolist()):
+            buckets[i] = buckets.get(i, 0) + c
+
+    def update(self, values):
+        values = np.asarray(values, dtype = float)
+        small = np.abs(values) <= MIN_MAGNITUDE
+        self.zero += int(small.sum())
+        self._add(self.positive, values[~small & (values > 0)])
+        self._add(self.negative, -values[~small & (values < 0)])
+        self.count += len(values)
+        return self
+
+    def merge(self, other):
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for i, c in theirs.items():
+                mine[i] = mine.get(i, 0) + c
+        self.zero += other.zero
+        self.count += other.count
+        return self
+
+    # Buckets in ascending order of value: (representative values, counts)
+    def _ordered(self):
+        neg = sorted(self.negative, reverse = True)
+        pos = sorted(self.positive)
+        mid = 2.0 / (self.gamma + 1)
+        values = ([-mid * self.gamma ** i for i in neg] + [0.0] +
+                  [mid * self.gamma ** i for i in pos])
+        counts = [self.negative[i] for i in neg] + [self.zero] + [self.positive[i] for i in pos]
+        return np.array(values), np.array(counts)
+
+    # Value at quantile q (a float or an array of floats in [0, 1])
+    def quantile(self, q):
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        values, counts = self._ordered()
+        ranks = np.asarray(q, dtype = float) * (self.count - 1)
+        return values[np.searchsorted(np.cumsum(counts), ranks, side = "right")]
+
+    def to_dict(self):
+        return {"relative_accuracy": self.relative_accuracy, "zero": self.zero, "count": self.count,
+                "positive": sorted(self.positive.items()), "negative": sorted(self.negative.items())}
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(d["relative_accuracy"])
+        sketch.zero, sketch.count = d["zero"], d["count"]
+        sketch.positive = {int(i): c for i, c in d["positive"]}
+        sketch.negative = {int(i): c for i, c in d["negative"]}
+        return sketch
+
+
+class ColumnStats(object):
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        # Sums of 2nd, 3rd and 4th powers of deviations from the mean
+        self.m2 = self.m3 = self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch()
+
+    # Add a chunk of values; non-finite values are ignored
+    def update(self, values):
+        values = np.asarray(values, dtype = float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return self
+        chunk = ColumnStats()
+        chunk.n = len(values)
+        chunk.mean = values.mean()
+        dev = values - chunk.mean
+        dev2 = dev * dev
+        chunk.m2, chunk.m3, chunk.m4 = dev2.sum(), (dev2 * dev).sum(), (dev2 * dev2).sum()
+        chunk.min, chunk.max = values.min(), values.max()
+        chunk.sketch.update(values)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        if not other.n:
+            return self
+        if not self.n:
+            self.n, self.mean, self.m2, self.m3, self.m4 = other.n, other.mean, other.m2, other.m3, other.m4
+        else:
+            na, nb = float(self.n), float(other.n)
+            n = na + nb
+            d = other.mean - self.mean
+            m2 = self.m2 + other.m2 + d ** 2 * na * nb / n
+            m3 = (self.m3 + other.m3 + d ** 3 * na * nb * (na - nb) / n ** 2
+                  + 3 * d * (na * other.m2 - nb * self.m2) / n)
+            m4 = (self.m4 + other.m4 + d ** 4 * na * nb * (na ** 2 - na * nb + nb ** 2) / n ** 3
+                  + 6 * d ** 2 * (na ** 2 * other.m2 + nb ** 2 * self.m2) / n ** 2
+                  + 4 * d * (na * other.m3 - nb * self.m3) / n)
+            self.n, self.mean = self.n + other.n, self.mean + d * nb / n
+            self.m2, self.m3, self.m4 = m2, m3, m4
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def variance(self, ddof = 1):
+        return self.m2 / (self.n - ddof) if self.n > ddof else np.nan
+
+    # Population skewness and excess kurtosis, as used by warm_start.py
+    @property
+    def skew(self):
+        return np.sqrt(self.n) * self.m3 / self.m2 ** 1.5 if self.m2 > 0 else 0.0
+
+    @property
+    def kurtosis(self):
+        return self.n * self.m4 / self.m2 ** 2 - 3.0 if self.m2 > 0 else 0.0
+
+    def quantile(self, q):
+        return np.clip(self.sketch.quantile(q), self.min, self.max)
+
+    # Same keys as warm_start.data_summary, or None for an empty column
+    def summary(self):
+        if not self.n:
+            return None
+        q25, median, q75 = self.quantile([0.25, 0.5, 0.75])
+        return {"n": self.n, "mean": self.mean, "std": np.sqrt(self.variance(ddof = 0)),
+                "skew": self.skew, "min": self.min, "max": self.max,
+                "median": median, "iqr": q75 - q25}
+
+    # One column of the Descriptive Summary table
+    def describe(self):
+        if not self.n:
+            return pd.Series({"count": 0})
+        q = self.quantile([0.25, 0.5, 0.75])
+        return pd.Series({"count": self.n, "mean": self.mean, "std": np.sqrt(self.variance()),
+                          "min": self.min, "25%": q[0], "50%": q[1], "75%": q[2], "max": self.max,
+                          "skew": self.skew, "kurtosis": self.kurtosis})
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "m3": self.m3, "m4": self.m4,
+                "min": self.min, "max": self.max, "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        stats = cls()
+        stats.n, stats.mean, stats.m2, stats.m3, stats.m4 = d["n"], d["mean"], d["m2"], d["m3"], d["m4"]
+        stats.min, stats.max = d["min"], d["max"]
+        stats.sketch = QuantileSketch.from_dict(d["sketch"])
+        return stats
+
+
+# Freedman-Diaconis number of histogram bins, falling back to default when
+# the spread is zero or unknown
+def suggested_bins(stats, default = 100, lo = 10, hi = 1000):
+    s = stats.summary() if stats is not None else None
+    if s is None or s["iqr"] <= 0 or s["max"] <= s["min"]:
+        return default
+    width = 2.0 * s["iqr"] / s["n"] ** (1.0 / 3.0)
+    return int(np.clip(np.ceil((s["max"] - s["min"]) / width), lo, hi))
+
+
+_memo = OrderedDict()
+_lock = threading.Lock()
+
+
+def _path(digest):
+    return os.path.join(STATS_DIR, os.path.basename(digest) + ".json")
+
+
+def cached_stats(digest, column):
+    with _lock:
+        if (digest, column) in _memo:
+            _memo.move_to_end((digest, column))
+            return _memo[(digest, column)]
+    try:
+        with open(_path(digest)) as fh:
+            entry = json.load(fh).get(str(column))
+        # Marks the file as recently used for evict()
+        os.utime(_path(digest))
+    except (OSError, ValueError):
+        entry = None
+    stats = ColumnStats.from_dict(entry) if entry is not None else None
+    if stats is not None:
+        _remember(digest, column, stats)
+    return stats
+
+
+def _remember(digest, column, stats):
+    with _lock:
+        _memo[(digest, column)] = stats
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last = False)
+
+
+# Keep stats in memory and add them to the file's JSON entry
+def store_stats(digest, column, stats):
+    _remember(digest, column, stats)
+    os.makedirs(STATS_DIR, exist_ok = True)
+    with _lock:
+        try:
+            with open(_path(digest)) as fh:
+                entries = json.load(fh)
+        except (OSError, ValueError):
+            entries = {}
+        entries[str(column)] = stats.to_dict()
+        fd, tmp_path = tempfile.mkstemp(dir = STATS_DIR, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(entries, fh)
+            os.replace(tmp_path, _path(digest))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        evict(STATS_FILES_KEPT)
+    return stats
+
+
+# Remove the least recently used stats files beyond max_files
+def evict(max_files):
+    entries = [entry for entry in os.scandir(STATS_DIR) if entry.name.endswith(".json")]
+    for entry in sorted(entries, key = lambda e: e.stat().st_mtime)[:-max_files or None]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+# Stats of an in-memory column, computed chunk by chunk on a cache miss
+def column_stats(digest, column, values):
+    stats = cached_stats(digest, column)
+    if stats is None:
+        stats = ColumnStats()
+        values = np.asarray(values)
+        for start in range(0, len(values), CHUNK_ROWS):
+            stats.update(values[start:start + CHUNK_ROWS])
+        store_stats(digest, column, stats)
+    return stats
+
+
+# df.describe() for the numeric columns, plus skewness and kurtosis
+def describe(digest, df):
+    columns = df.select_dtypes("number").columns
+    return pd.DataFrame({col: column_stats(digest, col, df[col].values).describe() for col in columns})
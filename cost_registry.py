@@ -0,0 +1,233 @@
+# Measured fit cost per distribution and a time-budgeted fit planner
+#
+# Every fresh fit records (distribution, sample size, seconds, failed,
+# optimiser iterations, warm start) in SQLite next to the fit cache. The
+# per-observation cost is the median over the most recent runs, falling back
+# to dist_cost_prior in all_params.py until a distribution has been
+# measured. plan_fits() uses it to order a "fit all" request longest-first
+# over the worker pool and to defer the distributions that would not finish
+# within a time budget or that keep failing.
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from all_params import default_fit_cost, dist_cost_prior
+from data_cache import CACHE_DIR
+
+
+COST_REGISTRY_PATH = os.path.join(CACHE_DIR, "fit_costs.sqlite")
+
+# Runs kept per distribution
+RUNS_KEPT = 50
+# Runs needed before measurements replace the prior
+MIN_RUNS = 3
+# Distributions failing at least this often (after MIN_RUNS) are skipped
+MAX_FAILURE_RATE = 0.8
+# Failures older than this are forgotten, so skipped distributions are
+# tried again
+FAILURE_RETRY_SECONDS = float(os.environ.get("FIT_FAILURE_RETRY_DAYS", 7)) * 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fit_runs (
+    dist_name TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    failed INTEGER NOT NULL,
+    recorded REAL NOT NULL,
+    iterations INTEGER,
+    warm INTEGER NOT NULL DEFAULT 0,
+    timeout INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# One cold and one warm-started fit of the same subsample per distribution
+# and data size bucket, the warm-start report's reference when no fits
+# without a warm start have been recorded
+_REFERENCE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS warm_references (
+    dist_name TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    warm_seconds REAL,
+    warm_iterations INTEGER,
+    cold_seconds REAL,
+    cold_iterations INTEGER,
+    recorded REAL NOT NULL,
+    PRIMARY KEY (dist_name, bucket)
+)
+"""
+
+# Columns added after the first release of the table
+_ADDED_COLUMNS = [("iterations", "INTEGER"), ("warm", "INTEGER NOT NULL DEFAULT 0"),
+                  ("timeout", "INTEGER NOT NULL DEFAULT 0")]
+
+
+class CostRegistry(object):
+
+    def __init__(self, path = COST_REGISTRY_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            existing = [row[1] for row in conn.execute("PRAGMA table_info(fit_runs)")]
+            for column, decl in _ADDED_COLUMNS:
+                if column not in existing:
+                    conn.execute("ALTER TABLE fit_runs ADD COLUMN {} {}".format(column, decl))
+            conn.execute("CREATE INDEX IF NOT EXISTS fit_runs_dist ON fit_runs (dist_name)")
+            conn.execute(_REFERENCE_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout = 30)
+
+    # timeout: the fit failed by running out of time
+    def record(self, dist_name, n, seconds, failed, iterations = None, warm = False,
+               timeout = False):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO fit_runs (dist_name, n, seconds, failed, recorded, iterations, warm,"
+                " timeout) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (dist_name, int(n), float(seconds), int(bool(failed)), time.time(),
+                 iterations, int(bool(warm)), int(bool(timeout))))
+            conn.execute(
+                "DELETE FROM fit_runs WHERE dist_name = ? AND rowid NOT IN (SELECT rowid FROM"
+                " fit_runs WHERE dist_name = ? ORDER BY recorded DESC LIMIT ?)",
+                (dist_name, dist_name, RUNS_KEPT))
+
+    # {dist_name: {"runs", "failure_rate", "failure_runs", "cost_per_1000",
+    # "measured"}}. failure_rate is taken over the failure_runs recorded within
+    # FAILURE_RETRY_SECONDS that did not time out: a timeout says the fit was
+    # slow, which the cost already accounts for, not that it cannot work.
+    def stats(self, dists):
+        dists = list(dists)
+        runs = {name: [] for name in dists}
+        if dists:
+            marks = ",".join("?" * len(dists))
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT dist_name, n, seconds, failed, timeout, recorded FROM fit_runs"
+                    " WHERE dist_name IN ({})".format(marks), dists).fetchall()
+            for name, n, seconds, failed, timeout, recorded in rows:
+                runs[name].append((n, seconds, failed, timeout, recorded))
+
+        cutoff = time.time() - FAILURE_RETRY_SECONDS
+        stats = {}
+        for name in dists:
+            prior = dist_cost_prior.get(name, default_fit_cost)
+            measured = len(runs[name]) >= MIN_RUNS
+            # Timed-out runs only give a lower bound, but a high one
+            per_1000 = [1000.0 * run[1] / max(run[0], 1) for run in runs[name]]
+            failures = [run[2] for run in runs[name] if not run[3] and run[4] >= cutoff]
+            stats[name] = {
+                "runs": len(runs[name]),
+                "failure_rate": np.mean(failures) if failures else 0.0,
+                "failure_runs": len(failures),
+                "cost_per_1000": float(np.median(per_1000)) if measured else prior,
+                "measured": measured,
+            }
+        return stats
+
+    # Median cost and optimiser iterations of successful runs without a warm
+    # start: {dist_name: {"cost_per_1000", "iterations"}}, None where unknown
+    def baseline(self, dists):
+        dists = list(dists)
+        if not dists:
+            return {}
+        marks = ",".join("?" * len(dists))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT dist_name, n, seconds, iterations FROM fit_runs WHERE warm = 0"
+                " AND failed = 0 AND dist_name IN ({})".format(marks), dists).fetchall()
+        runs = {name: [] for name in dists}
+        for name, n, seconds, iterations in rows:
+            runs[name].append((1000.0 * seconds / max(n, 1), iterations))
+        baseline = {}
+        for name, values in runs.items():
+            iterations = [it for _, it in values if it is not None]
+            baseline[name] = {
+                "cost_per_1000": float(np.median([c for c, _ in values])) if values else None,
+                "iterations": int(np.median(iterations)) if iterations else None,
+            }
+        return baseline
+
+    # Reference fits on a subsample of n values for data in bucket; seconds
+    # and iterations are None for a fit that failed
+    def record_reference(self, dist_name, bucket, n, warm_seconds, warm_iterations,
+                         cold_seconds, cold_iterations):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO warm_references VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (dist_name, bucket, n, warm_seconds, warm_iterations, cold_seconds,
+                          cold_iterations, time.time()))
+
+    # {dist_name: {"n", "warm_seconds", "warm_iterations", "cold_seconds",
+    # "cold_iterations"}} of the reference fits recorded for bucket
+    def references(self, dists, bucket):
+        dists = list(dists)
+        if not dists:
+            return {}
+        marks = ",".join("?" * len(dists))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT dist_name, n, warm_seconds, warm_iterations, cold_seconds, cold_iterations"
+                " FROM warm_references WHERE bucket = ? AND dist_name IN ({})".format(marks),
+                [bucket] + dists).fetchall()
+        keys = ["n", "warm_seconds", "warm_iterations", "cold_seconds", "cold_iterations"]
+        return {row[0]: dict(zip(keys, row[1:])) for row in rows}
+
+    def predict(self, dist_name, n):
+        return self.stats([dist_name])[dist_name]["cost_per_1000"] * n / 1000.0
+
+
+# Size bucket of n observations: its order of magnitude
+def size_bucket(n):
+    return int(np.floor(np.log10(max(n, 1))))
+
+
+# Reason to skip a distribution whatever the budget, or None
+def _failing(s):
+    if s["failure_runs"] >= MIN_RUNS and s["failure_rate"] >= MAX_FAILURE_RATE:
+        return "failed in {:.0%} of its last {} runs".format(s["failure_rate"], s["failure_runs"])
+    return None
+
+
+# Pick what fits in budget seconds over max_workers lanes, cheapest first so
+# as many fits as possible get done, then order the picked ones longest-first
+# (LPT) so the slowest fits are not left until the end. items are
+# (key, dist_name, n) with hashable keys, free the keys already cached (they
+# cost nothing). Distributions that keep failing are skipped even without a
+# budget. Returns (planned keys, {deferred key: reason}, {key: predicted
+# seconds}).
+def plan_items(registry, items, budget = None, max_workers = 1, free = ()):
+    stats = registry.stats(sorted(set(name for _, name, _ in items)))
+    deferred = {}
+    costs = {}
+    for key, name, n in items:
+        reason = _failing(stats[name])
+        if key in free:
+            costs[key] = 0.0
+        elif reason is not None:
+            deferred[key] = reason
+        else:
+            costs[key] = stats[name]["cost_per_1000"] * n / 1000.0
+
+    picked = []
+    lanes = [0.0] * max(1, max_workers)
+    for key in sorted(costs, key = lambda key: costs[key]):
+        lane = int(np.argmin(lanes))
+        if budget and costs[key] and lanes[lane] + costs[key] > budget:
+            deferred[key] = "predicted {:.1f}s fit would not finish within the {:g}s budget".format(
+                costs[key], budget)
+            continue
+        lanes[lane] += costs[key]
+        picked.append(key)
+    planned = sorted(picked, key = lambda key: -costs[key])
+    return planned, deferred, costs
+
+
+# plan_items for the distributions of one column of n observations. Returns
+# (planned names, {deferred name: reason}).
+def plan_fits(registry, dists, n, budget = None, max_workers = 1, free = ()):
+    planned, deferred, _ = plan_items(registry, [(name, name, n) for name in dists], budget,
+                                      max_workers, free)
+    return planned, deferred
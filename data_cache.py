@@ -0,0 +1,134 @@
+# Content-addressed cache for uploaded CSV files
+#
+# Every widget interaction reruns main(), which used to re-parse the upload
+# with pd.read_csv each time. Parsed frames are stored on local disk as
+# Parquet, keyed by a hash of the uploaded bytes, and read back memory-mapped.
+# The cache directory is trimmed least-recently-used first once it grows past
+# FIT_DATA_CACHE_BYTES. Files read in streaming mode are kept there as CSV
+# copies, so they are trimmed the same way.
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+CACHE_DIR = os.environ.get("FIT_CACHE_DIR",
+                           os.path.join(tempfile.gettempdir(), "distribution_fitter_cache"))
+DATA_CACHE_DIR = os.path.join(CACHE_DIR, "data")
+DATA_CACHE_BYTES = int(os.environ.get("FIT_DATA_CACHE_BYTES", 2 * 1024 ** 3))
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(data_file):
+    h = hashlib.sha256()
+    data_file.seek(0)
+    for chunk in iter(lambda: data_file.read(CHUNK_SIZE), b""):
+        h.update(chunk)
+    data_file.seek(0)
+    return h.hexdigest()
+
+
+def _entry_paths(digest):
+    base = os.path.join(DATA_CACHE_DIR, digest)
+    return base + ".parquet", base + ".pkl"
+
+
+def _read_entry(digest):
+    parquet_path, pickle_path = _entry_paths(digest)
+    try:
+        if pq is not None and os.path.exists(parquet_path):
+            # Touch the entry so eviction sees it as recently used
+            os.utime(parquet_path, None)
+            return pq.read_table(parquet_path, memory_map = True).to_pandas()
+        if os.path.exists(pickle_path):
+            os.utime(pickle_path, None)
+            return pd.read_pickle(pickle_path)
+    except OSError:
+        # Evicted by another session between the check and the read
+        pass
+    return None
+
+
+def _write_entry(digest, df):
+    os.makedirs(DATA_CACHE_DIR, exist_ok = True)
+    parquet_path, pickle_path = _entry_paths(digest)
+    fd, tmp_path = tempfile.mkstemp(dir = DATA_CACHE_DIR, suffix = ".tmp")
+    os.close(fd)
+    try:
+        # Columns with mixed object types cannot always be stored as Parquet
+        try:
+            if pq is None:
+                raise ValueError("pyarrow is not installed")
+            df.to_parquet(tmp_path, index = False)
+            path = parquet_path
+        except Exception:
+            df.to_pickle(tmp_path)
+            path = pickle_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    evict(DATA_CACHE_BYTES)
+
+
+# Remove least recently used entries until the cache fits in max_bytes
+def evict(max_bytes):
+    if not os.path.isdir(DATA_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(DATA_CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+# Path of a copy of the upload (an io.BytesIO, as Streamlit's uploads are) in
+# the cache directory, written on first use, so chunked readers can go back
+# to the file without holding its bytes. The copy is written from the
+# buffer, leaving the upload's position alone for other threads.
+def upload_path(data_file, digest):
+    path = os.path.join(DATA_CACHE_DIR, digest + ".csv")
+    if os.path.exists(path):
+        os.utime(path, None)
+        return path
+    os.makedirs(DATA_CACHE_DIR, exist_ok = True)
+    fd, tmp_path = tempfile.mkstemp(dir = DATA_CACHE_DIR, suffix = ".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh, data_file.getbuffer() as view:
+            for start in range(0, len(view), CHUNK_SIZE):
+                fh.write(view[start:start + CHUNK_SIZE])
+        # Make room first so the new copy is not the one evicted
+        evict(max(DATA_CACHE_BYTES - os.path.getsize(tmp_path), 0))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+# Returns (digest, DataFrame), parsing the CSV only on a cache miss; digest
+# can be passed when the caller has already hashed the file
+def read_csv_cached(data_file, digest = None):
+    digest = digest if digest is not None else file_digest(data_file)
+    df = _read_entry(digest)
+    if df is None:
+        df = pd.read_csv(data_file)
+        data_file.seek(0)
+        _write_entry(digest, df)
+    return digest, df
@@ -0,0 +1,52 @@
+# Server-side helpers for the Exploratory Data Analysis page
+#
+# px.histogram and st.dataframe serialise every row of the frame into the
+# page. Here histograms are reduced to bin counts with NumPy and tables are
+# cut into pages before anything is sent to the browser, so the payload
+# depends on the number of bins or rows per page, not on the file size.
+import numpy as np
+import pandas as pd
+
+
+# Largest number of categories drawn for a non-numeric column
+MAX_CATEGORIES = 50
+
+
+# Bin counts of a column: ("numeric", left edges, widths, counts) for numeric
+# columns, ("categorical", labels, None, counts) for the most frequent
+# values of anything else
+def bin_counts(series, bins):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.values.astype(float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return "numeric", np.empty(0), np.empty(0), np.empty(0, dtype = int)
+        counts, edges = np.histogram(values, bins = int(bins))
+        return "numeric", edges[:-1], np.diff(edges), counts
+    counts = series.astype(str).value_counts().iloc[:MAX_CATEGORIES]
+    return "categorical", counts.index.values, None, counts.values
+
+
+# Bar chart of pre-computed bin counts, drawn like px.histogram
+def histogram_figure(column, kind, x, widths, counts):
+    import plotly.graph_objects as go
+    if kind == "numeric":
+        bar = go.Bar(x = x, y = counts, width = widths, offset = 0, name = column,
+                     hovertemplate = "%{x:.4g} to %{customdata:.4g}<br>count=%{y}<extra></extra>",
+                     customdata = x + widths)
+    else:
+        bar = go.Bar(x = x, y = counts, name = column)
+    figure = go.Figure(bar)
+    figure.update_layout(bargap = 0 if kind == "numeric" else 0.2,
+                         xaxis_title = column, yaxis_title = "count")
+    return figure
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+# Rows of one page (1-based), as a view of the frame
+def table_page(df, page, page_size):
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
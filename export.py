@@ -0,0 +1,79 @@
+# Export of fit results as CSV, JSON or Parquet
+#
+# The results table (errors, AIC, BIC, fit times, failures and named
+# parameters) is written to a file object a slice at a time: CSV in chunks of
+# CHUNK_ROWS rows, JSON one record per line and Parquet one row group per
+# chunk, so no single string of the whole table is built on top of the
+# frame. Used by batch_fit.py, the download on the fitting page and
+# run_history.py.
+import io
+import json
+import math
+import os
+
+
+FORMATS = ["csv", "json", "parquet"]
+MIME_TYPES = {"csv": "text/csv", "json": "application/json",
+              "parquet": "application/octet-stream"}
+CHUNK_ROWS = 10000
+
+
+# NaN and infinities are not valid JSON
+def _clean(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    return value
+
+
+def _records(results):
+    columns = list(results.columns)
+    for row in results.itertuples(index = False, name = None):
+        yield {col: _clean(value) for col, value in zip(columns, row)}
+
+
+# Tabular formats store the named parameters as a JSON object per row
+def _flat(results):
+    if "params" not in results.columns:
+        return results
+    flat = results.copy()
+    flat["params"] = flat["params"].map(lambda p: json.dumps(_clean(p)) if isinstance(p, dict) else p)
+    return flat
+
+
+def write_results(results, fh, fmt):
+    if fmt not in FORMATS:
+        raise ValueError("Unsupported output format '{}', use one of {}".format(fmt, FORMATS))
+    if fmt == "json":
+        fh.write(b"[")
+        for i, record in enumerate(_records(results)):
+            fh.write(b"\n" if i == 0 else b",\n")
+            fh.write(json.dumps(record, default = str).encode())
+        fh.write(b"\n]\n")
+        return
+    flat = _flat(results)
+    if fmt == "csv":
+        for start in range(0, max(len(flat), 1), CHUNK_ROWS):
+            chunk = flat.iloc[start:start + CHUNK_ROWS]
+            fh.write(chunk.to_csv(index = False, header = start == 0).encode())
+        return
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pq.write_table(pa.Table.from_pandas(flat, preserve_index = False), fh,
+                   row_group_size = CHUNK_ROWS)
+
+
+# The format is taken from the file extension
+def write_file(results, path):
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError("Unsupported output format '{}', use one of {}".format(fmt, FORMATS))
+    with open(path, "wb") as fh:
+        write_results(results, fh, fmt)
+
+
+def export_bytes(results, fmt):
+    buffer = io.BytesIO()
+    write_results(results, buffer, fmt)
+    return buffer.getvalue()
@@ -0,0 +1,656 @@
+# Parallel distribution fitting engine
+#
+# Fits each distribution in its own task on a process pool instead of one
+# after the other on the Streamlit script thread, and gives every
+# distribution its own time budget. The public surface mirrors the parts of
+# fitter.Fitter that the app uses (fit / summary / get_best) so results come
+# back in the same summary frame.
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.stats
+from scipy import optimize
+from fitter import get_common_distributions
+from scipy.special import rel_entr
+
+from all_params import dist_list, dist_parm_dict, dist_subsets
+from cost_registry import plan_fits, plan_items, size_bucket
+from tracing import NULL_TRACER
+from warm_start import data_summary, initial_guess
+
+
+DEFAULT_TIMEOUT = float(os.environ.get("FIT_TIMEOUT", 30))
+DEFAULT_WORKERS = int(os.environ.get("FIT_MAX_WORKERS", os.cpu_count() or 1))
+
+# Deduplicate data into (unique values, counts) when there are at least this
+# many rows per distinct value
+COMPRESS_MIN_RATIO = float(os.environ.get("FIT_COMPRESS_MIN_RATIO", 4))
+
+# Size of the subsample the warm-start reference fits are run on
+WARM_REFERENCE_SAMPLE = int(os.environ.get("FIT_WARM_REFERENCE_SAMPLE", 2000))
+
+# Extra time allowed on top of the per-distribution timeout before a worker
+# that ignores the alarm (stuck inside C code) is considered hung.
+HARD_TIMEOUT_GRACE = 5
+
+ERROR_COLUMNS = ["sumsquare_error", "aic", "bic", "kl_div"]
+
+# Error recorded for fits lost when a hung pool is torn down. Some of them
+# never started, so none of them are written to the fit cache.
+CANCELLED = "cancelled: workers stopped responding"
+TIMEOUT_PREFIX = "timeout after"
+TIMEOUT_ERROR = TIMEOUT_PREFIX + " {}s"
+
+
+# Failures that depend on the time a fit was given rather than on the data.
+# They are never written to the fit cache, so a later run with more time
+# fits the distribution again.
+def is_transient(error):
+    return error is not None and (error == CANCELLED or error.startswith(TIMEOUT_PREFIX))
+
+
+class FitTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout()
+
+
+# Per out-of-support observation, as in scipy's penalised likelihood
+_SUPPORT_PENALTY = 100 * np.log(np.finfo(float).max)
+
+
+def _weighted_nnlf(theta, dist, values, counts):
+    shapes, loc, scale = theta[:-2], theta[-2], theta[-1]
+    if scale <= 0 or not np.all(dist._argcheck(*shapes)):
+        return np.inf
+    logpdf = dist.logpdf(values, *shapes, loc = loc, scale = scale)
+    bad = ~np.isfinite(logpdf)
+    return -np.sum(counts[~bad] * logpdf[~bad]) + counts[bad].sum() * _SUPPORT_PENALTY
+
+
+# Nelder-Mead as in scipy's rv_continuous.fit, also recording the number of
+# iterations in info
+def _counting_fmin(info):
+    def fmin(func, x0, args = (), disp = 0):
+        xopt, _, iterations, _, _ = optimize.fmin(func, x0, args = args, disp = disp,
+                                                  full_output = True)
+        info["iterations"] = int(iterations)
+        return xopt
+    return fmin
+
+
+# MLE on deduplicated data: every log-likelihood term is weighted by how
+# often its value occurs, so the cost scales with distinct values, not rows.
+# Without a start, scipy's default start is taken on a weighted resample.
+def weighted_fit(dist, values, counts, start = None, info = None, max_start_sample = 10000):
+    if start is None:
+        rng = np.random.RandomState(0)
+        size = int(min(counts.sum(), max_start_sample))
+        x0 = dist._fitstart(rng.choice(values, size = size, p = counts / counts.sum()))
+    else:
+        shapes, loc, scale = start
+        x0 = tuple(shapes) + (loc, scale)
+    fmin = _counting_fmin(info if info is not None else {})
+    return fmin(_weighted_nnlf, x0, args = (dist, values, counts))
+
+
+# A warm start is only used if every observation is inside its support
+def _start_is_feasible(dist, values, start):
+    shapes, loc, scale = start
+    return bool(np.all(np.isfinite(dist.logpdf(values, *shapes, loc = loc, scale = scale))))
+
+
+# Runs inside a worker process: fit a single distribution within its budget.
+# data is either the raw values or a (unique values, counts) pair, and start
+# an optional (shapes, loc, scale) warm start from warm_start.initial_guess.
+def _fit_task(task):
+    key, name, data, timeout, start = task
+    info = {"iterations": None, "warm": False, "pid": os.getpid()}
+    use_alarm = (hasattr(signal, "setitimer")
+                 and threading.current_thread() is threading.main_thread())
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    start_time = info["started"] = time.time()
+    try:
+        with warnings.catch_warnings(), np.errstate(all = "ignore"):
+            warnings.simplefilter("ignore")
+            # Some names in dist_list are missing from newer scipy releases
+            dist = getattr(scipy.stats, name)
+            values = data[0] if isinstance(data, tuple) else data
+            if start is not None and not _start_is_feasible(dist, values, start):
+                start = None
+            info["warm"] = start is not None
+
+            if isinstance(data, tuple):
+                params = weighted_fit(dist, *data, start = start, info = info)
+            elif start is not None:
+                shapes, loc, scale = start
+                params = dist.fit(data, *shapes, loc = loc, scale = scale,
+                                  optimizer = _counting_fmin(info))
+            else:
+                params = dist.fit(data, optimizer = _counting_fmin(info))
+            params = tuple(float(p) for p in params)
+        return key, name, params, time.time() - start_time, None, info
+    except FitTimeout:
+        return (key, name, None, time.time() - start_time,
+                TIMEOUT_ERROR.format(timeout), info)
+    except Exception as e:
+        return key, name, None, time.time() - start_time, repr(e), info
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+# Run (key, name, data, timeout, start) tasks on a process pool and yield
+# (key, name, params, elapsed, error, info) as each one finishes
+def run_fit_tasks(tasks, max_workers, timeout):
+    if not tasks:
+        return
+    pending = set((task[0], task[1]) for task in tasks)
+    pool = multiprocessing.Pool(max(1, min(max_workers, len(tasks))))
+    try:
+        results = pool.imap_unordered(_fit_task, tasks)
+        while pending:
+            # If nothing finishes within one budget plus grace, every busy
+            # worker has overrun: kill the pool rather than wait forever.
+            try:
+                key, name, params, elapsed, error, info = results.next(
+                    timeout = timeout + HARD_TIMEOUT_GRACE)
+            except multiprocessing.TimeoutError:
+                pool.terminate()
+                for key, name in sorted(pending, key = str):
+                    yield key, name, None, timeout, CANCELLED, {}
+                break
+            pending.discard((key, name))
+            yield key, name, params, elapsed, error, info
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def histogram(data, bins, weights = None):
+    y, edges = np.histogram(data, bins = bins, weights = weights, density = True)
+    x = (edges[:-1] + edges[1:]) / 2.0
+    return x, y
+
+
+# Scoring stage: the same error measures as fitter.Fitter, computed for many
+# distributions at once from their fitted parameters. Only the histogram
+# depends on the number of bins, so changing bins never requires a refit.
+# Returns ({name: pdf at bin centers}, DataFrame of errors indexed by name).
+def score_all(fitted_param, x, y, n):
+    names = list(fitted_param)
+    errors = pd.DataFrame(np.inf, index = names, columns = ERROR_COLUMNS)
+    ok = [name for name in names if fitted_param[name] is not None]
+    if not ok:
+        return {}, errors
+
+    with warnings.catch_warnings(), np.errstate(all = "ignore"):
+        warnings.simplefilter("ignore")
+        pdf = np.vstack([getattr(scipy.stats, name).pdf(x, *fitted_param[name]) for name in ok])
+        logpdf = np.vstack([getattr(scipy.stats, name).logpdf(x, *fitted_param[name]) for name in ok])
+        k = np.array([len(fitted_param[name]) for name in ok])
+
+        sq_error = np.sum((pdf - y) ** 2, axis = 1)
+        log_lik = np.sum(logpdf, axis = 1)
+        # scipy.stats.entropy(pdf, y) for every row: both sides normalised to sum to one
+        kl = np.sum(rel_entr(pdf / pdf.sum(axis = 1, keepdims = True), y / y.sum()), axis = 1)
+        errors.loc[ok, "sumsquare_error"] = sq_error
+        errors.loc[ok, "aic"] = 2 * k - 2 * log_lik
+        errors.loc[ok, "bic"] = n * np.log(sq_error / n) + k * np.log(n)
+        errors.loc[ok, "kl_div"] = kl
+    return dict(zip(ok, pdf)), errors
+
+
+# "common", "all", a name from all_params.dist_subsets, or a comma separated
+# list of scipy.stats distribution names
+def resolve_distributions(spec):
+    if spec == "common":
+        return get_common_distributions()
+    if spec == "all":
+        return list(dist_list)
+    if spec in dist_subsets:
+        return list(dist_subsets[spec])
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in dist_parm_dict]
+    if unknown:
+        raise ValueError("Unknown distributions: {}".format(", ".join(unknown)))
+    return names
+
+
+# Pair fitted values with their parameter names from dist_parm_dict
+def named_params(dist_name, params):
+    if params is None:
+        return {}
+    names = dist_parm_dict.get(dist_name)
+    if names is None or len(names) != len(params):
+        names = ["p{}".format(i) for i in range(len(params))]
+    return dict(zip(names, params))
+
+
+class ParallelFitter(object):
+
+    # cache / cache_key: optional result_cache.ResultCache and the
+    # (data digest, column) pair identifying the data being fitted
+    # binner: optional callable bins -> (x, y, n) used instead of a histogram
+    # of data, e.g. streaming.StreamingColumn.histogram when data is only a
+    # sample of a larger file
+    # compress: "auto" fits on (unique values, counts) when that shrinks the
+    # data by at least COMPRESS_MIN_RATIO; True / False force it on or off
+    # registry: optional cost_registry.CostRegistry that records every fit
+    # warm_start: start families known to warm_start.py from data-driven
+    # initial guesses instead of scipy's defaults
+    # summary: optional warm_start.data_summary-style dict for the warm-start
+    # guesses, e.g. column_stats.ColumnStats.summary() over every row
+    # tracer: optional tracing.Tracer timing each phase and every fit
+    def __init__(self, data, distributions, bins = 100,
+                 timeout = DEFAULT_TIMEOUT, max_workers = DEFAULT_WORKERS,
+                 cache = None, cache_key = None, binner = None, compress = "auto",
+                 registry = None, warm_start = True, tracer = None, summary = None):
+        self.tracer = tracer if tracer is not None else NULL_TRACER
+        self._data = np.asarray(data, dtype = float)
+        self._data = self._data[np.isfinite(self._data)]
+        self.n_obs = len(self._data)
+        self.counts = None
+        self.compression_ratio = 1.0
+        if compress:
+            with self.tracer.phase("deduplicate"):
+                values, counts = np.unique(self._data, return_counts = True)
+            ratio = self.n_obs / max(len(values), 1)
+            if compress is True or ratio >= COMPRESS_MIN_RATIO:
+                self._data, self.counts, self.compression_ratio = values, counts, ratio
+        self.distributions = list(distributions)
+        self.bins = bins
+        self.timeout = timeout
+        self.max_workers = max(1, min(max_workers, len(self.distributions) or 1))
+        self.binner = binner or self._histogram
+        with self.tracer.phase("histogram", bins = bins):
+            self.x, self.y, self.n = self.binner(bins)
+        self.cache = cache if cache_key is not None else None
+        self.cache_key = cache_key
+        self.cached = set()
+        self.registry = registry
+        self.deferred = {}
+        self.warm_start = warm_start
+        self.summary_stats = summary
+        self.fit_info = {}
+
+        self.fitted_param = {}
+        self.fitted_pdf = {}
+        self.fit_time = {}
+        self.fit_error = {}
+        self.df_errors = pd.DataFrame(columns = ERROR_COLUMNS)
+        # Nothing to fit: every distribution is reported as deferred
+        if not self.n_obs:
+            self.deferred = dict.fromkeys(self.distributions, "no finite values in the column")
+            self.distributions = []
+
+    def _histogram(self, bins):
+        if not self.n_obs:
+            return np.zeros(0), np.zeros(0), 0
+        x, y = histogram(self._data, bins, weights = self.counts)
+        return x, y, self.n_obs
+
+    @property
+    def is_compressed(self):
+        return self.counts is not None
+
+    # Approximate memory held by the data, histogram and fitted pdfs, and by
+    # the object a bound binner keeps alive (e.g. a StreamingColumn)
+    @property
+    def nbytes(self):
+        arrays = [self._data, self.counts, self.x, self.y] + list(self.fitted_pdf.values())
+        owner = getattr(self.binner, "__self__", self)
+        return (sum(a.nbytes for a in arrays if a is not None)
+                + int(self.df_errors.memory_usage(deep = True).sum())
+                + (getattr(owner, "nbytes", 0) if owner is not self else 0))
+
+    # Estimation stage bookkeeping; parameters do not depend on bins
+    def _record(self, name, params, elapsed, error):
+        if params is not None:
+            self.fitted_param[name] = params
+        self.fit_time[name] = elapsed
+        if error is not None:
+            self.fit_error[name] = error
+
+    def _score(self, names):
+        with self.tracer.phase("score"):
+            pdfs, errors = score_all({name: self.fitted_param.get(name) for name in names},
+                                     self.x, self.y, self.n)
+        self.fitted_pdf.update(pdfs)
+        for name in names:
+            self.df_errors.loc[name] = errors.loc[name].values
+
+    # Record a fresh fit and write it through to the cache
+    def _store(self, name, params, elapsed, error, info):
+        if "started" in info:
+            self.tracer.span(name, info["started"], elapsed, category = "fit", pid = info["pid"],
+                             tid = 0, args = {"warm": info["warm"], "iterations": info["iterations"],
+                                              "error": error})
+        self._record(name, params, elapsed, error)
+        self._score([name])
+        self.fit_info[name] = info
+        if error == CANCELLED:
+            return
+        with self.tracer.phase("fit cache write"):
+            if self.cache is not None and not is_transient(error):
+                digest, column = self.cache_key
+                self.cache.put(digest, column, name, params, elapsed, error)
+            if self.registry is not None:
+                self.registry.record(name, len(self._data), elapsed, error is not None,
+                                     info.get("iterations"), info.get("warm"), is_transient(error))
+
+    # Restrict the run to what cost_registry.plan_fits expects to finish
+    # within budget seconds (None for no limit); the rest go to self.deferred
+    def plan(self, budget = None, max_workers = None):
+        if self.registry is None:
+            return self
+        self.distributions, deferred = plan_fits(
+            self.registry, self.distributions, len(self._data), budget,
+            max_workers or self.max_workers, self._cached_names())
+        self.deferred.update(deferred)
+        if budget:
+            self.timeout = min(self.timeout, budget)
+        return self
+
+    # Distributions the cache will serve, which cost nothing to plan
+    def _cached_names(self):
+        if self.cache is None:
+            return set()
+        digest, column = self.cache_key
+        return set(name for name, entry in self.cache.get_many(
+            digest, column, self.distributions).items() if not is_transient(entry["error"]))
+
+    # Record and score everything already in the cache; returns the names
+    def _replay_cached(self):
+        if self.cache is None:
+            return []
+        digest, column = self.cache_key
+        with self.tracer.phase("fit cache lookup"):
+            cached = self.cache.get_many(digest, column, self.distributions)
+        # Timeouts cached before they were excluded are fitted again
+        cached = {name: entry for name, entry in cached.items() if not is_transient(entry["error"])}
+        for name, entry in cached.items():
+            self._record(name, entry["params"], entry["fit_time"], entry["error"])
+            self.cached.add(name)
+        self._score(list(cached))
+        return list(cached)
+
+    # Finished fits as plain JSON types, to be restored with load_state on a
+    # fitter built from the same data
+    def state(self):
+        return {
+            "distributions": list(self.distributions),
+            "deferred": dict(self.deferred),
+            "cached": sorted(self.cached),
+            "fits": {name: {"params": self.fitted_param.get(name), "fit_time": self.fit_time[name],
+                            "error": self.fit_error.get(name), "info": self.fit_info.get(name)}
+                     for name in self.fit_time},
+        }
+
+    def load_state(self, state):
+        self.distributions = list(state["distributions"])
+        self.deferred = dict(state["deferred"])
+        self.cached = set(state["cached"])
+        for name, fit in state["fits"].items():
+            params = tuple(fit["params"]) if fit["params"] is not None else None
+            self._record(name, params, fit["fit_time"], fit["error"])
+            if fit["info"] is not None:
+                self.fit_info[name] = fit["info"]
+        self._score(list(state["fits"]))
+        self._finish()
+        return self
+
+    # Measure what warm starts save. Every warm-started fresh fit with no
+    # reference in the registry for this data size bucket is fitted once
+    # with and once without its warm start on the same subsample of at most
+    # sample_size values; the pair is recorded for warm_start.savings_report.
+    def fit_references(self, sample_size = WARM_REFERENCE_SAMPLE):
+        if self.registry is None:
+            return self
+        bucket = size_bucket(self.n_obs)
+        names = [name for name, info in self.fit_info.items()
+                 if info.get("warm") and name not in self.cached]
+        known = self.registry.references(names, bucket)
+        names = [name for name in names if name not in known]
+        if not names:
+            return self
+        size = int(min(self.n_obs, sample_size))
+        rng = np.random.RandomState(0)
+        if self.is_compressed:
+            sample = rng.choice(self._data, size = size, p = self.counts / self.counts.sum())
+        else:
+            sample = rng.choice(self._data, size = size, replace = False)
+        summary = data_summary(sample)
+        tasks = []
+        for name in names:
+            tasks.append((True, name, sample, self.timeout, initial_guess(name, summary)))
+            tasks.append((False, name, sample, self.timeout, None))
+        runs = {}
+        with self.tracer.phase("warm start references", fits = len(tasks)):
+            for warm, name, _, elapsed, error, info in run_fit_tasks(tasks, self.max_workers,
+                                                                     self.timeout):
+                if error == CANCELLED:
+                    continue
+                runs[warm, name] = ((elapsed, info.get("iterations")) if error is None
+                                    else (None, None))
+        for name in names:
+            # Pairs lost to a hung pool are measured on a later run
+            if (True, name) in runs and (False, name) in runs:
+                self.registry.record_reference(name, bucket, size, *runs[True, name],
+                                               *runs[False, name])
+        return self
+
+    # Pool tasks for the distributions not served from the cache
+    def _tasks(self, key = None):
+        data = (self._data, self.counts) if self.is_compressed else self._data
+        names = [name for name in self.distributions if name not in self.cached]
+        starts = dict.fromkeys(names)
+        if self.warm_start and names:
+            with self.tracer.phase("warm start guesses"):
+                summary = self.summary_stats or data_summary(self._data, self.counts)
+                starts = {name: initial_guess(name, summary) for name in names}
+        return [(key, name, data, self.timeout, starts[name]) for name in names]
+
+    def _finish(self):
+        self.df_errors = self.df_errors.astype(float)
+
+    # Re-score every fitted distribution against a new histogram, no refits
+    def rebin(self, bins):
+        self.bins = bins
+        with self.tracer.phase("histogram", bins = bins):
+            self.x, self.y, self.n = self.binner(bins)
+        self.fitted_pdf = {}
+        self.df_errors = pd.DataFrame(columns = ERROR_COLUMNS)
+        self._score(list(self.fit_time))
+        self.df_errors = self.df_errors.astype(float)
+        return self
+
+    # Yields each distribution name as soon as its fit has been scored
+    def iter_fit(self):
+        try:
+            for name in self._replay_cached():
+                yield name
+            for _, name, params, elapsed, error, info in run_fit_tasks(
+                    self._tasks(), self.max_workers, self.timeout):
+                self._store(name, params, elapsed, error, info)
+                yield name
+        finally:
+            self._finish()
+
+    def fit(self):
+        for _ in self.iter_fit():
+            pass
+        return self
+
+    def hist(self):
+        import matplotlib.pyplot as plt
+        width = self.x[1] - self.x[0] if len(self.x) > 1 else 1.0
+        plt.bar(self.x, self.y, width = width)
+
+    def plot_pdf(self, names, lw = 2):
+        import matplotlib.pyplot as plt
+        for name in names:
+            if name in self.fitted_pdf:
+                plt.plot(self.x, self.fitted_pdf[name], lw = lw, label = name)
+        plt.legend()
+
+    def ranked(self, method = "sumsquare_error"):
+        return self.df_errors.astype(float).sort_values(by = method)
+
+    def summary(self, Nbest = 5, method = "sumsquare_error", plot = True):
+        best = self.ranked(method).iloc[0:Nbest]
+        if plot:
+            import matplotlib.pyplot as plt
+            with self.tracer.phase("summary plot"):
+                plt.clf()
+                self.hist()
+                self.plot_pdf(best.index)
+                plt.grid(True)
+        return best
+
+    # Full ranked table with fit times, failures and named parameters
+    def results(self, method = "sumsquare_error"):
+        ranked = self.ranked(method)
+        frame = ranked.reset_index().rename(columns = {"index": "dist_name"})
+        frame["fit_time"] = [self.fit_time.get(name) for name in ranked.index]
+        frame["error"] = [self.fit_error.get(name) for name in ranked.index]
+        frame["params"] = [named_params(name, self.fitted_param.get(name)) for name in ranked.index]
+        return frame
+
+    def get_best(self, method = "sumsquare_error"):
+        name = self.ranked(method).index[0]
+        return {name: self.fitted_param[name]}
+
+    # {name: params} of the n best distributions that were fitted, best first
+    def get_top(self, n = 5, method = "sumsquare_error"):
+        names = [name for name in self.ranked(method).index if name in self.fitted_param]
+        return {name: self.fitted_param[name] for name in names[:n]}
+
+    # Observations the parameters were estimated on: (values, counts), with
+    # counts None unless the data was deduplicated
+    @property
+    def data(self):
+        return self._data, self.counts
+
+
+# Fits the same distribution set to several columns at once. Every
+# (column, distribution) fit shares one process pool, and each column's
+# histogram is built once and reused by both stages.
+class MultiColumnFitter(object):
+
+    def __init__(self, columns, distributions, bins = 100,
+                 timeout = DEFAULT_TIMEOUT, max_workers = DEFAULT_WORKERS,
+                 cache = None, digest = None, registry = None, warm_start = True,
+                 tracer = None):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.registry = registry
+        # (column, distribution) fits in planned order, longest first
+        self.order = []
+        self.fitters = {}
+        for col, data in columns.items():
+            self.fitters[col] = ParallelFitter(
+                data, distributions, bins = bins, timeout = timeout, max_workers = max_workers,
+                cache = cache, cache_key = (digest, col) if digest is not None else None,
+                registry = registry, warm_start = warm_start, tracer = tracer)
+        self.total = sum(len(f.distributions) for f in self.fitters.values())
+
+    # Plan every (column, distribution) fit together over the shared
+    # workers, so the whole request stays within the budget
+    def plan(self, budget = None):
+        if self.registry is None:
+            return self
+        items, free = [], set()
+        for col, f in self.fitters.items():
+            items.extend(((col, name), name, len(f._data)) for name in f.distributions)
+            free.update((col, name) for name in f._cached_names())
+        self.order, deferred, _ = plan_items(self.registry, items, budget, self.max_workers, free)
+        for col, f in self.fitters.items():
+            f.distributions = [name for c, name in self.order if c == col]
+            f.deferred.update((name, reason) for (c, name), reason in deferred.items() if c == col)
+            if budget:
+                f.timeout = min(f.timeout, budget)
+        if budget:
+            self.timeout = min(self.timeout, budget)
+        self.total = sum(len(f.distributions) for f in self.fitters.values())
+        return self
+
+    @property
+    def deferred(self):
+        return {(col, name): reason for col, f in self.fitters.items()
+                for name, reason in f.deferred.items()}
+
+    @property
+    def nbytes(self):
+        return sum(f.nbytes for f in self.fitters.values())
+
+    def state(self):
+        return {"columns": {col: f.state() for col, f in self.fitters.items()}}
+
+    def load_state(self, state):
+        for col, column_state in state["columns"].items():
+            self.fitters[col].load_state(column_state)
+        self.total = sum(len(f.distributions) for f in self.fitters.values())
+        return self
+
+    def rebin(self, bins):
+        for f in self.fitters.values():
+            f.rebin(bins)
+        return self
+
+    # Yields (column, distribution) as each fit is scored
+    def iter_fit(self):
+        try:
+            tasks = []
+            for col, f in self.fitters.items():
+                for name in f._replay_cached():
+                    yield col, name
+                tasks.extend(f._tasks(key = col))
+            if self.order:
+                rank = {key: i for i, key in enumerate(self.order)}
+                tasks.sort(key = lambda task: rank.get((task[0], task[1]), 0))
+            for col, name, params, elapsed, error, info in run_fit_tasks(
+                    tasks, self.max_workers, self.timeout):
+                self.fitters[col]._store(name, params, elapsed, error, info)
+                yield col, name
+        finally:
+            for f in self.fitters.values():
+                f._finish()
+
+    def fit(self):
+        for _ in self.iter_fit():
+            pass
+        return self
+
+    # One row per column: the best distribution, its score and parameters
+    def best_matrix(self, method = "sumsquare_error"):
+        rows = []
+        for col, f in self.fitters.items():
+            results = f.results(method)
+            if len(results) == 0:
+                continue
+            best = results.iloc[0]
+            rows.append({"column": col, "dist_name": best["dist_name"],
+                         method: best[method], "params": best["params"]})
+        return pd.DataFrame(rows, columns = ["column", "dist_name", method, "params"])
+
+    def results(self, method = "sumsquare_error"):
+        frames = []
+        for col, f in self.fitters.items():
+            frame = f.results(method)
+            frame.insert(0, "rank", range(1, len(frame) + 1))
+            frame.insert(0, "column", col)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index = True) if frames else pd.DataFrame()
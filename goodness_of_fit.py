@@ -0,0 +1,277 @@
+# Goodness of fit and parameter confidence intervals for the top candidates
+#
+# The ranking on the fitting page uses binned errors only. This optional
+# stage takes the best few fitted distributions and computes, for each one:
+#   * the Kolmogorov-Smirnov and Anderson-Darling statistics against every
+#     observation, vectorised over the candidates (ties from deduplicated
+#     data are handled through the value counts, nothing is expanded)
+#   * a parametric bootstrap: resamples are drawn from the fitted
+#     distribution, refitted from the fitted parameters as a warm start and
+#     scored the same way. That gives percentile confidence intervals for the
+#     named parameters from all_params.dist_parm_dict, and p-values that
+#     account for the parameters having been estimated from the data.
+# Resamples are drawn and scored in batches of BATCH_SIZE, one batch per task
+# on a process pool, and the total number of resamples over all candidates
+# is capped by FIT_BOOTSTRAP_RESAMPLES. Resamples have at most
+# FIT_BOOTSTRAP_MAX_SAMPLE values; for larger data the bootstrap spread is
+# rescaled by sqrt(m / n) (and the KS statistic compared as sqrt(n) * D), so
+# intervals for very large columns are asymptotic approximations.
+# Quantised data (values on a grid, e.g. rounded to 0.1) has ties that
+# continuous resamples never have, which would inflate the observed
+# statistics against every candidate. Resamples are rounded to the data's
+# grid; when the data has ties but no grid can be found, the p-values are
+# left empty. Rounding adds an error to both statistics that does not shrink
+# with n, so no rescaling applies: for quantised data with more than
+# FIT_BOOTSTRAP_MAX_SAMPLE values the p-values compare the resamples with the
+# statistics of a random subsample of the data of the same size, refitted
+# like a resample.
+import multiprocessing
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy.stats
+
+from fit_engine import DEFAULT_TIMEOUT, DEFAULT_WORKERS, HARD_TIMEOUT_GRACE, named_params
+from tracing import NULL_TRACER
+
+
+GOF_RESAMPLES = int(os.environ.get("FIT_BOOTSTRAP_RESAMPLES", 200))
+GOF_MAX_SAMPLE = int(os.environ.get("FIT_BOOTSTRAP_MAX_SAMPLE", 5000))
+# Resamples drawn, refitted and scored per pool task
+BATCH_SIZE = 25
+CONFIDENCE = 0.95
+
+GOF_COLUMNS = ["dist_name", "ks_stat", "ks_pvalue", "ad_stat", "ad_pvalue", "resamples",
+               "failed", "resolution", "seconds"]
+INTERVAL_COLUMNS = ["dist_name", "param", "estimate", "std_error", "lower", "upper"]
+
+_TINY = np.finfo(float).tiny
+
+
+# KS and Anderson-Darling statistics of sorted values for every row of cdf
+# and sf (shape (rows, k), the fitted distributions at those values). counts
+# is the multiplicity of each value, None when every value occurs once.
+def gof_statistics(cdf, sf, counts = None):
+    k = cdf.shape[-1]
+    counts = np.ones(k) if counts is None else np.asarray(counts, dtype = float)
+    n = counts.sum()
+    after = np.cumsum(counts)
+    before = after - counts
+    ks = np.maximum(np.max(after / n - cdf, axis = -1), np.max(cdf - before / n, axis = -1))
+    # sum over ranks i in each group of (2i - 1) and of (2n + 1 - 2i)
+    w_cdf = 2 * before * counts + counts ** 2
+    w_sf = counts * (2 * n - 2 * before - counts)
+    log_cdf = np.log(np.maximum(cdf, _TINY))
+    log_sf = np.log(np.maximum(sf, _TINY))
+    ad = -n - np.sum(w_cdf * log_cdf + w_sf * log_sf, axis = -1) / n
+    return ks, ad
+
+
+# Observed statistics of every fitted distribution on the same sorted values
+def observed_statistics(values, counts, fitted):
+    order = np.argsort(values)
+    values = np.asarray(values)[order]
+    counts = np.asarray(counts)[order] if counts is not None else None
+    with warnings.catch_warnings(), np.errstate(all = "ignore"):
+        warnings.simplefilter("ignore")
+        cdf = np.vstack([getattr(scipy.stats, name).cdf(values, *params)
+                         for name, params in fitted.items()])
+        sf = np.vstack([getattr(scipy.stats, name).sf(values, *params)
+                        for name, params in fitted.items()])
+    ks, ad = gof_statistics(cdf, sf, counts)
+    return {name: (ks[i], ad[i]) for i, name in enumerate(fitted)}
+
+
+# (origin, step) of the grid sorted distinct values lie on, None if they do
+# not lie on one
+def data_grid(values):
+    values = np.asarray(values, dtype = float)
+    if len(values) < 2:
+        return None
+    step = np.diff(values).min()
+    if step <= 0 or (values[-1] - values[0]) / step > 1e9:
+        return None
+    steps = (values - values[0]) / step
+    if not np.allclose(steps, np.round(steps), rtol = 0, atol = 1e-6):
+        return None
+    return float(values[0]), float(step)
+
+
+# Observed statistics on a random subsample of size values (drawn without
+# replacement, so it is distributed like a fresh sample) of the data given by
+# distinct values and their counts. Each candidate is refitted on the
+# subsample from its fitted parameters, as the bootstrap resamples are, so
+# both sides see estimated parameters.
+def subsample_statistics(values, counts, fitted, size, seed = 0):
+    ends = np.cumsum(counts)
+    rng = np.random.RandomState(seed)
+    # distinct positions among the n observations, without a permutation of n
+    positions = np.unique(rng.randint(0, ends[-1], size = size))
+    while len(positions) < size:
+        extra = rng.randint(0, ends[-1], size = size - len(positions))
+        positions = np.unique(np.concatenate([positions, extra]))
+    drawn = np.bincount(np.searchsorted(ends, positions, side = "right"), minlength = len(values))
+    keep = drawn > 0
+    values, counts = np.asarray(values)[keep], drawn[keep]
+    sample = np.repeat(values, counts)
+    refitted = {}
+    with warnings.catch_warnings(), np.errstate(all = "ignore"):
+        warnings.simplefilter("ignore")
+        for name, params in fitted.items():
+            try:
+                refit = getattr(scipy.stats, name).fit(sample, *params[:-2], loc = params[-2],
+                                                       scale = params[-1])
+            except Exception:
+                refit = params
+            refitted[name] = refit if np.all(np.isfinite(refit)) else params
+    return observed_statistics(values, counts, refitted)
+
+
+# Runs inside a worker process: draw a batch of resamples from the fitted
+# distribution (rounded to grid when it is set), refit each one from the
+# fitted parameters and score every refit at once. Refits stop once timeout
+# seconds have passed; the rest of the batch is reported as failed.
+def _bootstrap_task(task):
+    name, params, size, resamples, seed, timeout, grid = task
+    start = time.time()
+    estimates = np.full((resamples, len(params)), np.nan)
+    with warnings.catch_warnings(), np.errstate(all = "ignore"):
+        warnings.simplefilter("ignore")
+        dist = getattr(scipy.stats, name)
+        samples = dist.rvs(*params, size = (resamples, size),
+                           random_state = np.random.RandomState(seed))
+        if grid is not None:
+            origin, step = grid
+            samples = np.round((samples - origin) / step) * step + origin
+        samples = np.sort(samples, axis = 1)
+        shapes, loc, scale = params[:-2], params[-2], params[-1]
+        for i, sample in enumerate(samples):
+            if time.time() - start > timeout:
+                break
+            try:
+                estimates[i] = dist.fit(sample, *shapes, loc = loc, scale = scale)
+            except Exception:
+                pass
+        ok = np.all(np.isfinite(estimates), axis = 1)
+        theta = [estimates[ok, j:j + 1] for j in range(len(params))]
+        ks, ad = gof_statistics(dist.cdf(samples[ok], *theta), dist.sf(samples[ok], *theta))
+    return name, estimates, ks, ad, time.time() - start
+
+
+# (name, params, size, resamples, seed, timeout, grid) tasks splitting the
+# resample budget evenly over the candidates
+def bootstrap_tasks(fitted, size, resamples, seed = 0, timeout = DEFAULT_TIMEOUT, grid = None):
+    per_dist = max(1, resamples // max(len(fitted), 1))
+    tasks = []
+    for name, params in fitted.items():
+        for start in range(0, per_dist, BATCH_SIZE):
+            task_seed = (seed * 1000003 + len(tasks)) % 2 ** 32
+            tasks.append((name, tuple(params), size, min(BATCH_SIZE, per_dist - start),
+                          task_seed, timeout, grid))
+    return tasks
+
+
+# Run bootstrap tasks on a process pool and yield each batch as it finishes.
+# If no batch finishes within one timeout plus grace the pool is killed and
+# the remaining batches are dropped.
+def run_bootstrap_tasks(tasks, max_workers, timeout):
+    if not tasks:
+        return
+    pool = multiprocessing.Pool(max(1, min(max_workers, len(tasks))))
+    try:
+        results = pool.imap_unordered(_bootstrap_task, tasks)
+        for _ in tasks:
+            try:
+                yield results.next(timeout = timeout + HARD_TIMEOUT_GRACE)
+            except multiprocessing.TimeoutError:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# Goodness of fit and confidence intervals for fitted ({name: params}, best
+# first) on values with optional counts. progress(done, total) is called
+# after every batch. Returns (gof, intervals) frames with GOF_COLUMNS and
+# INTERVAL_COLUMNS.
+def assess(values, counts, fitted, resamples = GOF_RESAMPLES, max_workers = DEFAULT_WORKERS,
+           max_sample = GOF_MAX_SAMPLE, confidence = CONFIDENCE, seed = 0,
+           timeout = DEFAULT_TIMEOUT, tracer = None, progress = None):
+    tracer = tracer if tracer is not None else NULL_TRACER
+    fitted = {name: tuple(params) for name, params in fitted.items() if params is not None}
+    n = int(counts.sum()) if counts is not None else len(values)
+    size = int(min(n, max_sample))
+    with tracer.phase("gof statistics"):
+        observed = observed_statistics(values, counts, fitted)
+    # Deduplicated data has ties; without a grid the bootstrap cannot match them
+    grid = data_grid(np.sort(values)) if counts is not None else None
+    valid_pvalues = counts is None or grid is not None
+    # Statistics the resamples are compared with, and the KS scale factors
+    compared, ks_scale = observed, (np.sqrt(size), np.sqrt(n))
+    if grid is not None and size < n:
+        with tracer.phase("gof subsample statistics", size = size):
+            compared = subsample_statistics(values, counts, fitted, size, seed)
+        ks_scale = (1.0, 1.0)
+
+    tasks = bootstrap_tasks(fitted, size, resamples, seed, timeout, grid)
+    batches = {name: [] for name in fitted}
+    seconds = dict.fromkeys(fitted, 0.0)
+    with tracer.phase("bootstrap", resamples = resamples, size = size):
+        for done, batch in enumerate(run_bootstrap_tasks(tasks, max_workers, timeout), start = 1):
+            batches[batch[0]].append(batch[1:4])
+            seconds[batch[0]] += batch[4]
+            if progress is not None:
+                progress(done, len(tasks))
+
+    rescale = np.sqrt(size / float(n))
+    alpha = 1.0 - confidence
+    gof_rows, interval_rows = [], []
+    for name, params in fitted.items():
+        params = np.array(params)
+        estimates = (np.vstack([b[0] for b in batches[name]]) if batches[name]
+                     else np.empty((0, len(params))))
+        ks = np.concatenate([b[1] for b in batches[name]] or [np.empty(0)])
+        ad = np.concatenate([b[2] for b in batches[name]] or [np.empty(0)])
+        ok = np.all(np.isfinite(estimates), axis = 1)
+        boot = params + (estimates[ok] - params) * rescale
+        ks_obs, ad_obs = observed[name]
+        ks_ref, ad_ref = compared[name]
+        b = int(ok.sum())
+        pvalue = lambda hits: (1.0 + hits) / (b + 1.0) if b and valid_pvalues else np.nan
+        gof_rows.append({"dist_name": name, "ks_stat": ks_obs,
+                         "ks_pvalue": pvalue(np.sum(ks_scale[0] * ks >= ks_scale[1] * ks_ref)),
+                         "ad_stat": ad_obs, "ad_pvalue": pvalue(np.sum(ad >= ad_ref)),
+                         "resamples": b, "failed": len(ok) - b,
+                         "resolution": grid[1] if grid is not None else np.nan,
+                         "seconds": seconds[name]})
+        if b > 1:
+            lower, upper = np.percentile(boot, [50 * alpha, 100 - 50 * alpha], axis = 0)
+            std_error = boot.std(axis = 0, ddof = 1)
+        else:
+            lower = upper = std_error = np.full(len(params), np.nan)
+        for j, (param, estimate) in enumerate(named_params(name, params).items()):
+            interval_rows.append({"dist_name": name, "param": param, "estimate": estimate,
+                                  "std_error": std_error[j], "lower": lower[j], "upper": upper[j]})
+    return (pd.DataFrame(gof_rows, columns = GOF_COLUMNS),
+            pd.DataFrame(interval_rows, columns = INTERVAL_COLUMNS))
+
+
+# assess() for the top distributions of a fitted ParallelFitter
+def assess_fitter(f, top = 3, method = "sumsquare_error", **kwargs):
+    values, counts = f.data
+    kwargs.setdefault("tracer", f.tracer)
+    return assess(values, counts, f.get_top(top, method), **kwargs)
+
+
+# The two tables of assess() as JSON-compatible records, for job files
+def gof_state(result):
+    gof, intervals = result
+    return {"gof": gof.to_dict("records"), "intervals": intervals.to_dict("records")}
+
+
+def load_gof_state(state):
+    return (pd.DataFrame(state["gof"], columns = GOF_COLUMNS),
+            pd.DataFrame(state["intervals"], columns = INTERVAL_COLUMNS))
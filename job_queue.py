@@ -0,0 +1,262 @@
+# Background fit jobs
+#
+# A fit submitted from the page runs on a worker thread of the server
+# process instead of the script thread, so a widget change (which stops the
+# script and reruns it) no longer throws the work away: the rerun finds the
+# job by its request key and polls it again. At most FIT_MAX_JOBS jobs run at
+# once over the whole server; queued jobs are started round-robin over the
+# sessions that submitted them, so one analyst queueing many fits does not
+# starve the others. Every finished job is written to
+# <FIT_CACHE_DIR>/jobs/<job id>.json (status, timings and the fitter state),
+# so results can be looked up by job id after they have left memory.
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from data_cache import CACHE_DIR
+from fit_engine import DEFAULT_WORKERS
+from session_store import SESSION_IDLE_SECONDS
+
+
+JOB_DIR = os.path.join(CACHE_DIR, "jobs")
+MAX_JOBS = int(os.environ.get("FIT_MAX_JOBS", 2))
+# Job files kept on disk, newest first
+JOB_FILES_KEPT = int(os.environ.get("FIT_JOB_FILES", 500))
+# Worker processes per job, so running jobs together stay within the CPUs
+JOB_WORKERS = max(1, DEFAULT_WORKERS // MAX_JOBS)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job(object):
+
+    def __init__(self, session_id, request, fn, description, serialize):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.request = request
+        self.description = description
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        # Small frame the job thread hands to the page while running
+        self.preview = None
+        self.error = None
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._fn = fn
+        self._serialize = serialize
+
+    # Called from the job thread
+    def update(self, progress, message = "", preview = None):
+        self.progress = progress
+        self.message = message
+        if preview is not None:
+            self.preview = preview
+
+    def snapshot(self):
+        return {"id": self.id, "description": self.description, "status": self.status,
+                "progress": self.progress, "message": self.message, "error": self.error,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished}
+
+
+class JobQueue(object):
+
+    def __init__(self, max_running = MAX_JOBS, job_dir = JOB_DIR):
+        self.max_running = max(1, max_running)
+        self.job_dir = job_dir
+        self._jobs = {}
+        # {session_id: deque of queued jobs}, served round-robin
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    # fn(job) runs on a worker thread and returns the result; serialize(result)
+    # gives the JSON-compatible form written to the job file
+    def submit(self, session_id, request, fn, description = "", serialize = None):
+        job = Job(session_id, request, fn, description, serialize)
+        with self._cond:
+            self._start_workers()
+            self._jobs[job.id] = job
+            self._queues.setdefault(session_id, deque()).append(job)
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    # Latest job of a session for a request key, None if there is none
+    def find(self, session_id, request):
+        with self._cond:
+            jobs = [job for job in self._jobs.values()
+                    if job.session_id == session_id and job.request == request]
+        return max(jobs, key = lambda job: job.submitted) if jobs else None
+
+    def session_jobs(self, session_id):
+        with self._cond:
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key = lambda job: job.submitted)
+
+    def queued(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    # Only queued jobs can be cancelled
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            self._queues[job.session_id].remove(job)
+            job.status, job.finished = CANCELLED, time.time()
+            job._fn = None
+        self._write(job)
+        return True
+
+    # Hand the in-memory result over to the caller; later lookups go to the
+    # job file
+    def take_result(self, job):
+        result, job.result = job.result, None
+        return result
+
+    # Whether a finished job's result can still be taken or read back
+    def has_result(self, job):
+        return job.result is not None or os.path.exists(self._path(job.id))
+
+    # Whether a job is still to finish or its result can still be had, so the
+    # same request need not be submitted again
+    def reusable(self, job):
+        return job is not None and (job.status in (QUEUED, RUNNING) or
+                                    job.status == DONE and self.has_result(job))
+
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, os.path.basename(job_id) + ".json")
+
+    # Job file contents ({"job": snapshot, "result": serialized}) or None
+    def load(self, job_id):
+        try:
+            with open(self._path(job_id)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _start_workers(self):
+        while len(self._threads) < self.max_running:
+            thread = threading.Thread(target = self._work, name = "fit-job-{}".format(len(self._threads)),
+                                      daemon = True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next(self):
+        for session_id in list(self._queues):
+            queue = self._queues[session_id]
+            if queue:
+                # Served sessions go to the back of the line
+                self._queues.move_to_end(session_id)
+                return queue.popleft()
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next()
+                job.status, job.started = RUNNING, time.time()
+            try:
+                job.result = job._fn(job)
+                status = DONE
+                job.progress = 1.0
+            except Exception as e:
+                job.error = repr(e)
+                status = FAILED
+            # The job function holds the fitter and its data; only the result
+            # is kept once the job is done
+            job._fn = job.preview = None
+            job.finished = time.time()
+            # The page may take the result as soon as it sees the final status
+            try:
+                self._write(job, status)
+            except OSError as e:
+                job.error = job.error or "job file not written: {!r}".format(e)
+            job.status = status
+            self._forget_finished()
+
+    def _write(self, job, status = None):
+        record = {"job": dict(job.snapshot(), status = status or job.status), "result": None}
+        if job.result is not None and job._serialize is not None:
+            record["result"] = job._serialize(job.result)
+        os.makedirs(self.job_dir, exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(dir = self.job_dir, suffix = ".tmp")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(record, fh, default = str)
+            os.replace(tmp_path, self._path(job.id))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._trim_files()
+
+    def _trim_files(self):
+        entries = [entry for entry in os.scandir(self.job_dir) if entry.name.endswith(".json")]
+        for entry in sorted(entries, key = lambda e: e.stat().st_mtime)[:-JOB_FILES_KEPT]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    # Only the newest job per request stays in memory, and finished jobs
+    # nobody came back for are dropped after the session idle time; both
+    # remain readable from their job files
+    def _forget_finished(self):
+        cutoff = time.time() - SESSION_IDLE_SECONDS
+        with self._cond:
+            latest = {}
+            for job in self._jobs.values():
+                key = (job.session_id, job.request)
+                if key not in latest or job.submitted > latest[key].submitted:
+                    latest[key] = job
+            for job_id, job in list(self._jobs.items()):
+                if job.status in FINISHED and (latest[(job.session_id, job.request)] is not job
+                                               or job.finished < cutoff):
+                    del self._jobs[job_id]
+            for session_id in [sid for sid, q in self._queues.items() if not q]:
+                del self._queues[session_id]
+
+
+# Job function building a ParallelFitter or MultiColumnFitter with build()
+# (reading or scanning the data happens here, off the script thread),
+# planning it within budget seconds and running it to completion, reporting
+# progress (and a ParallelFitter's error table) after each fit
+def fit_job(build, budget = None):
+    def run(job):
+        job.update(0.0, "Preparing the data")
+        fitter = build().plan(budget or None)
+        fitters = fitter.fitters.values() if hasattr(fitter, "fitters") else [fitter]
+        total = sum(len(f.distributions) for f in fitters)
+        for done, item in enumerate(fitter.iter_fit(), start = 1):
+            name = item[1] if isinstance(item, tuple) else item
+            preview = fitter.df_errors.astype(float) if hasattr(fitter, "df_errors") else None
+            job.update(done / max(total, 1), "Fitted {}/{} (last: {})".format(done, total, name),
+                       preview)
+        # Not under a time budget: the reference fits would run past it
+        if not budget and hasattr(fitter, "fit_references"):
+            job.update(job.progress, "Measuring warm-start savings")
+            fitter.fit_references()
+        return fitter
+    return run
+
+
+def fitter_state(fitter):
+    return fitter.state()
+
+
+# One queue per server process
+JOBS = JobQueue()
@@ -1,21 +1,45 @@
 # Core package
 import streamlit as st
 import streamlit.components.v1 as stc
-import plotly.express as px
-from fitter import Fitter, get_common_distributions, get_distributions
-import matplotlib.pyplot as plt
-import pandas as pd
 import time
 import base64
+import json
 
 
-from all_params import dist_list, dist_parm_dict
+# pandas, scipy, matplotlib and plotly are imported by the pages that use
+# them, so Home and About render without loading the scientific stack
 from all_texts import html_temp, desc_temp, about_text
+from session_store import SESSIONS, current_session_id
+from warmup import preload_in_background
 
 
 
-param_val = []
-timestr = time.strftime("%Y%m%d-%H%M%S")
+_stores = {}
+
+
+
+# Fit cache and cost registry, opened on first use
+def get_fit_cache():
+    if "fit_cache" not in _stores:
+        from result_cache import ResultCache
+        _stores["fit_cache"] = ResultCache()
+    return _stores["fit_cache"]
+
+
+
+def get_cost_registry():
+    if "cost_registry" not in _stores:
+        from cost_registry import CostRegistry
+        _stores["cost_registry"] = CostRegistry()
+    return _stores["cost_registry"]
+
+
+
+def get_run_history():
+    if "run_history" not in _stores:
+        from run_history import RunHistory
+        _stores["run_history"] = RunHistory()
+    return _stores["run_history"]
 
 
 
@@ -25,22 +49,498 @@ def load_data():
 
 
 
-def search_parm(keyword):
-    for key in dist_parm_dict:
-        if key == keyword:
-            return dist_parm_dict[key]
+# Download of a results table in the chosen format. The file is encoded once
+# per key and format and kept in the session; without st.download_button
+# (streamlit < 0.88) it is embedded as a link only once asked for.
+def download_results(results, stem, key, label = "Download Fitted Distributions' Summary"):
+    from export import FORMATS, MIME_TYPES, export_bytes
+
+    st.markdown(f"### **⬇️{label} 🎈🎈**")
+    fmt = st.selectbox("File Format", FORMATS, key = f"format {key}")
+    new_filename = "{}_{}.{}".format(stem, time.strftime("%Y%m%d-%H%M%S"), fmt)
+    if not hasattr(st, "download_button") and not st.checkbox("Prepare Download Link",
+                                                              key = f"link {key}"):
+        return
+    session = current_session_id()
+    data = SESSIONS.get(session, ("export", key, fmt))
+    if data is None:
+        data = export_bytes(results, fmt)
+        SESSIONS.put(session, ("export", key, fmt), data, nbytes = len(data))
+    if hasattr(st, "download_button"):
+        st.download_button(f"Download {fmt.upper()} file!", data, file_name = new_filename,
+                           mime = MIME_TYPES[fmt], key = f"download {key}")
+        return
+    b64 = base64.b64encode(data).decode()
+    href = f'<a href="data:{MIME_TYPES[fmt]};base64,{b64}" download="{new_filename}">Download {fmt.upper()} file!</a>'
+    st.markdown(href, unsafe_allow_html = True)
 
 
 
-# Function to download
-def download_csv(data):
-    csvfile = data.to_csv(index=False)
-    b64 = base64.b64encode(csvfile.encode()).decode()
-    new_filename = "dist_summary_{}_.csv".format(timestr)
-    st.markdown("### **⬇️Download Fitted Distributions' Summary 🎈🎈**")
-    href = f'<a href="data:file/csv;base64,{b64}" download="{new_filename}">Download CSV file!</a>'
-    st.markdown(href, unsafe_allow_html = True)
 
+def doc_link(dist_name):
+    if dist_name in ["frechet_l", "frechet_r", "reciprocal"]:
+        return f"https://docs.scipy.org/doc/scipy-0.14.0/reference/generated/scipy.stats.{dist_name}.html"
+    return f"https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.{dist_name}.html"
+
+
+
+# Content digest of the upload. Hashing reads every byte, so the digest is
+# kept in this session's store under the upload's identity (Streamlit's file
+# id, name and size) and only computed again for a new upload.
+def upload_digest(data_file):
+    from data_cache import file_digest
+    session = current_session_id()
+    with data_file.getbuffer() as view:
+        size = view.nbytes
+    key = ("digest", getattr(data_file, "id", None), data_file.name, size)
+    digest = SESSIONS.get(session, key)
+    if digest is None:
+        digest = file_digest(data_file)
+        SESSIONS.put(session, key, digest, nbytes = len(digest))
+    return digest
+
+
+
+# (digest, DataFrame) of the upload, kept in this session's bounded store
+# between reruns and rebuilt from the upload cache after eviction
+def load_frame(data_file):
+    from data_cache import read_csv_cached
+    session = current_session_id()
+    digest = upload_digest(data_file)
+    df = SESSIONS.get(session, ("frame", digest))
+    if df is None:
+        digest, df = read_csv_cached(data_file, digest)
+        SESSIONS.put(session, ("frame", digest), df)
+    return digest, df
+
+
+
+# One page of the frame at a time, so the payload does not grow with the file
+def show_table(df):
+    from eda import page_count, table_page
+
+    left, right = st.beta_columns(2)
+    page_size = left.selectbox("Rows per Page", [25, 50, 100, 500], index = 1)
+    pages = page_count(len(df), page_size)
+    page = right.number_input(f"Page (of {pages})", min_value = 1, max_value = pages, value = 1,
+                              step = 1)
+    rows = table_page(df, page, page_size)
+    st.dataframe(rows)
+    if len(rows):
+        st.write(f"Rows {rows.index[0]} to {rows.index[-1]} of {len(df)}")
+
+
+
+# Bin counts of a column, computed once per session, file, column and bins
+def column_histogram(digest, df, col, bins):
+    from eda import bin_counts
+    session = current_session_id()
+    key = ("histogram", digest, col, bins)
+    counts = SESSIONS.get(session, key)
+    if counts is None:
+        counts = bin_counts(df[col], bins)
+        SESSIONS.put(session, key, counts, nbytes = sum(a.nbytes for a in counts[1:] if a is not None))
+    return counts
+
+
+
+# Sidebar timing breakdown of the last fit request, with the spans as a
+# Chrome trace file
+def show_timing(tracer):
+    st.sidebar.subheader("Timing Breakdown")
+    st.sidebar.write("Phases (seconds include nested phases)")
+    st.sidebar.dataframe(tracer.breakdown("phase"))
+    fits = tracer.breakdown("fit")
+    if len(fits):
+        st.sidebar.write(f"Distribution fits ({fits['seconds'].sum():.2f}s of worker time)")
+        st.sidebar.dataframe(fits[["name", "seconds"]])
+    b64 = base64.b64encode(tracer.to_json().encode()).decode()
+    new_filename = "fit_trace_{}.json".format(time.strftime("%Y%m%d-%H%M%S"))
+    href = f'<a href="data:application/json;base64,{b64}" download="{new_filename}">Download Chrome trace (JSON)</a>'
+    st.sidebar.markdown(href, unsafe_allow_html = True)
+
+
+
+# This session's fit jobs, and any finished job looked up by its id
+def show_jobs():
+    import pandas as pd
+    from fit_engine import named_params
+    from job_queue import JOBS
+
+    with st.sidebar.beta_expander("Fit Jobs"):
+        jobs = JOBS.session_jobs(current_session_id())
+        if jobs:
+            st.dataframe(pd.DataFrame([job.snapshot() for job in jobs],
+                                      columns = ["id", "status", "progress", "description"]))
+        job_id = st.text_input("Look Up a Fit Job by ID").strip()
+        if job_id:
+            record = JOBS.load(job_id)
+            if record is None:
+                st.warning(f"No fit job {job_id}")
+                return
+            st.write({k: record["job"][k] for k in ["status", "description", "error"]})
+            state = record["result"] or {"columns": {}}
+            if "gof" in state:
+                # A goodness-of-fit job
+                for table in state.values():
+                    st.dataframe(pd.DataFrame(table))
+                return
+            columns = state["columns"] if "columns" in state else {None: state}
+            st.dataframe(pd.DataFrame([
+                {"column": col, "dist_name": name, "fit_time": fit["fit_time"], "error": fit["error"],
+                 "params": json.dumps(named_params(name, fit["params"]))}
+                for col, column_state in columns.items()
+                for name, fit in column_state["fits"].items()]))
+
+
+
+# Past runs recorded in the local run history, downloadable again without
+# refitting
+def show_history():
+    history = get_run_history()
+    with st.sidebar.beta_expander("Run History"):
+        runs = history.runs()
+        if not len(runs):
+            st.write("No runs recorded yet")
+            return
+        st.dataframe(runs[["run_id", "created", "source", "description"]])
+        runs = runs.set_index("run_id")
+        run_id = st.selectbox("Select a Run", runs.index.to_list(),
+                              format_func = lambda r: f"{r} ({runs.loc[r, 'source']})")
+        results = history.load(run_id)
+        if results is None:
+            st.warning(f"Run {run_id} is no longer recorded")
+            return
+        st.write(json.loads(runs.loc[run_id, "settings"]))
+        download_results(results, f"dist_summary_{run_id}", ("run", run_id),
+                         label = "Download Run Results")
+
+
+
+# (data, cache_key, binner, summary, notice) for a column of the parsed frame,
+# or for a column streamed from the upload when df is None; summary is the
+# column's cached one-pass statistics over every row and notice describes how
+# a streamed column was read. Draws nothing on the page, so it can run on a
+# fit job's thread. A streamed column is read from the upload's copy in the
+# data cache, so the binner holds a path and not the file's bytes.
+def column_inputs(data_file, df, col, digest, tracer):
+    from column_stats import column_stats, store_stats
+    if df is not None:
+        with tracer.phase("column stats", column = col):
+            summary = column_stats(digest, col, df[col].values).summary()
+        return df[col].values, (digest, col), None, summary, None
+
+    from data_cache import upload_path
+    from streaming import StreamingColumn
+    with tracer.phase("streaming scan", column = col):
+        column = StreamingColumn(upload_path(data_file, digest), col).scan()
+    if not column.n:
+        # Fails the job, whose error is shown on the page
+        raise ValueError(f"Column {col} has no numeric values to fit")
+    summary = store_stats(digest, col, column.stats).summary()
+    sample, sampled = column.sample, column.is_sampled
+    # The fitter keeps its own copy of the values
+    column.sample = None
+    if not sampled:
+        notice = f"Streaming mode: all {column.n} values fit in memory, no sampling needed"
+        return sample, (digest, col), column.histogram, summary, notice
+    notice = (f"Streaming mode (approximate): parameters estimated on a uniform random sample of "
+              f"{len(sample)} of {column.n} values (seed {column.seed}); errors, AIC and BIC "
+              f"scored on a histogram of all values read in chunks of {column.chunksize} rows")
+    # Sampled parameters are cached apart from exact ones
+    cache_key = (digest, f"{col}|sample={column.sample_size},seed={column.seed}")
+    return sample, cache_key, column.histogram, summary, notice
+
+
+
+# Freedman-Diaconis number of bins from the column's statistics; 100 for
+# non-numeric and streamed columns. A widget's default is part of its
+# identity, so it must not change once drawn: a streamed column's statistics
+# only appear after its fit job has scanned it, which would reset the input
+# and throw away the user's bin count.
+def default_bins(digest, df, col):
+    import pandas as pd
+    from column_stats import column_stats, suggested_bins
+    if df is None or not pd.api.types.is_numeric_dtype(df[col]):
+        return 100
+    return suggested_bins(column_stats(digest, col, df[col].values))
+
+
+
+def show_deferred(deferred):
+    import pandas as pd
+    if deferred:
+        st.warning(f"{len(deferred)} distributions deferred by the fit planner")
+        st.dataframe(pd.DataFrame({"reason": deferred}))
+
+
+
+# Poll a fit job until it finishes and return its fitter, or None if it
+# failed. A rerun stops the polling, not the job. restore(state) rebuilds the
+# result from the job file when it has been taken by an earlier rerun;
+# preview(errors) shows the error table of a running single-column job.
+def wait_for_job(job, restore, tracer, status, preview = None):
+    from job_queue import DONE, FINISHED, JOBS, QUEUED
+
+    progress = st.progress(job.progress)
+    with tracer.phase("wait for fit job"):
+        while job.status not in FINISHED:
+            progress.progress(job.progress)
+            if job.status == QUEUED:
+                status.text(f"Fit job {job.id} is waiting for a free worker "
+                            f"({JOBS.queued()} jobs queued)")
+            else:
+                status.text(f"Fit job {job.id}: {job.message}")
+                errors = job.preview
+                if preview is not None and errors is not None:
+                    preview(errors)
+            time.sleep(0.25)
+    progress.progress(1.0)
+
+    if job.status != DONE:
+        status.error(f"Fit job {job.id} {job.status}: {job.error}")
+        return None
+    f = JOBS.take_result(job)
+    if f is None:
+        # Taken by an earlier rerun and since evicted from the session
+        record = JOBS.load(job.id)
+        if record is None or record["result"] is None:
+            status.error(f"Results of fit job {job.id} could not be read back, press Process again")
+            return None
+        f = restore(record["result"])
+    return f
+
+
+
+# The session's fitter for request: kept from an earlier rerun, read back from
+# a finished job, or fitted by a new background job when submit is set.
+# build() returns an unfitted ParallelFitter or MultiColumnFitter. It is run
+# by the job, and on the script thread only to restore a finished job whose
+# fitter has been dropped from the session store (for a streamed column that
+# reads the file again). record(f, job) is called once a job's fitter has
+# been read. Returns None while there is nothing to show.
+def session_fitter(request, build, budget, tracer, status, submit, description, preview = None,
+                   record = None):
+    from fit_engine import CANCELLED
+    from job_queue import JOBS, fit_job, fitter_state
+
+    session = current_session_id()
+    f = SESSIONS.get(session, request)
+    fitters = lambda f: f.fitters.values() if hasattr(f, "fitters") else [f]
+    # Fits lost to a hung pool, and fitters whose streamed file has left the
+    # data cache, are rebuilt on the next click
+    retry = f is not None and submit and (getattr(f, "expired", False) or
+                                          any(CANCELLED in c.fit_error.values() for c in fitters(f)))
+    if f is not None and not retry:
+        return f
+
+    job = JOBS.find(session, request)
+    if submit and (retry or not JOBS.reusable(job)):
+        job = JOBS.submit(session, request, fit_job(build, budget), description, fitter_state)
+    if job is None:
+        return None
+    f = wait_for_job(job, lambda state: build().load_state(state), tracer, status, preview)
+    if f is not None:
+        SESSIONS.put(session, request, f)
+        if record is not None:
+            with tracer.phase("record run"):
+                record(f, job)
+    return f
+
+
+
+# Fit as a background job and keep the ranked table up to date as each
+# distribution finishes. request identifies the fit within the session and
+# inputs() returns (data, cache_key, binner, summary, notice); it is called
+# when the fitter is built (see session_fitter). submit is the state of the
+# Process button and source names the file and column in the run history.
+def fit_and_report(request, inputs, dists, bins_input, selection, no_to_show, budget, warm,
+                   tracer, submit, source):
+    import matplotlib.pyplot as plt
+    from fit_engine import ParallelFitter
+    from job_queue import JOB_WORKERS
+    from warm_start import savings_report
+
+    def build():
+        data, cache_key, binner, summary, notice = inputs()
+        f = ParallelFitter(data, distributions = dists, bins = bins_input, cache = get_fit_cache(),
+                           cache_key = cache_key, binner = binner, registry = get_cost_registry(),
+                           max_workers = JOB_WORKERS, warm_start = warm, tracer = tracer,
+                           summary = summary)
+        # Kept with the fitter so reruns show it next to the results
+        f.notice = notice
+        return f
+
+    def record(f, job):
+        get_run_history().record(job.id, request[1], source, f"{len(f.fit_time)} distributions",
+                                 {"distributions": list(dists), "bins": f.bins, "criterion": selection,
+                                  "budget": budget, "warm_start": warm, "deferred": f.deferred},
+                                 f.results(selection))
+
+    status = st.empty()
+    table = st.empty()
+    f = session_fitter(request, build, budget, tracer, status, submit,
+                       f"{source}, {len(dists)} distributions",
+                       lambda errors: table.dataframe(errors.sort_values(selection).iloc[0:no_to_show]),
+                       record)
+    if f is None:
+        return
+    if f.notice:
+        st.info(f.notice)
+    f.tracer = tracer
+    if f.bins != bins_input:
+        try:
+            f.rebin(bins_input)
+        except OSError:
+            # The streamed file's copy was trimmed from the data cache
+            f.expired = True
+            status.error("The streamed file is no longer cached, press Process to read it again")
+            return
+    show_deferred(f.deferred)
+    if not f.fit_time:
+        return
+    table.dataframe(f.ranked(selection).iloc[0:no_to_show])
+
+    results = f.results(selection)
+    status.success(f"Top {no_to_show} Distributions Summary Based on {selection} Sorting Criteria")
+    if f.cached:
+        st.info(f"{len(f.cached)} of {len(f.distributions)} distributions served from the fit cache")
+    if f.is_compressed:
+        st.info(f"Weighted fitting on {len(f.counts)} distinct values of {f.n_obs} rows "
+                f"(compression ratio {f.compression_ratio:.1f}x)")
+    if f.fit_error:
+        st.warning("Skipped: " + ", ".join(f"{k} ({v})" for k, v in sorted(f.fit_error.items())))
+
+    st.success("Fitted Distribution Plot")
+    fig, ax = plt.subplots()
+    f.summary(Nbest = no_to_show, method = selection)
+    with tracer.phase("render plot"):
+        st.pyplot(fig)
+    with tracer.phase("download link"):
+        download_results(results, "dist_summary", request + (f.bins, selection))
+
+    if f.fit_info:
+        with st.beta_expander("Warm Start Report"):
+            st.write("Optimiser iterations and fit time compared with earlier runs without a warm "
+                     "start or, where there are none, with one cold and one warm-started reference "
+                     "fit of a subsample, measured once per distribution and data size (the "
+                     "baseline column says which). Reference fits are skipped under a time budget.")
+            st.dataframe(savings_report(f, get_cost_registry()))
+
+    st.success(f"Best Fitted Distribution Parameters")
+    key_list = results["dist_name"].iloc[0]
+
+    # Joining parameters and values
+    st.write(f"The {key_list} Distribution's Fitted Parameters Are:")
+    st.write(results["params"].iloc[0])
+
+    st.success(
+        f"For More Information on {key_list} Distribution Parameters Visit Scipy Documentation")
+    st.markdown(f"[Scipy's {key_list} Distribution Documentation Link]({doc_link(key_list)})",
+                unsafe_allow_html = True)
+
+    show_goodness_of_fit(request, f, selection, tracer)
+
+
+
+# Optional stage after ranking: KS and Anderson-Darling tests and bootstrap
+# confidence intervals of the named parameters for the top distributions,
+# run as a background job like the fit
+def show_goodness_of_fit(request, f, selection, tracer):
+    from goodness_of_fit import GOF_RESAMPLES, assess_fitter, gof_state, load_gof_state
+    from job_queue import JOB_WORKERS, JOBS
+
+    with st.beta_expander("Goodness of Fit and Parameter Confidence Intervals"):
+        st.write("Kolmogorov-Smirnov and Anderson-Darling statistics against every observation, "
+                 "with parametric bootstrap p-values and 95% confidence intervals for the "
+                 "parameters of the top distributions. For data on a grid (e.g. rounded values) "
+                 "the resamples are rounded the same way; p-values are left empty for data with "
+                 "ties that are not on a grid.")
+        fitted = len(f.fitted_param)
+        if not fitted:
+            return
+        top = st.number_input("Number of Top Distributions to Test", min_value = 1,
+                              max_value = fitted, value = min(3, fitted), step = 1)
+        resamples = st.number_input("Bootstrap Resamples (shared by the distributions)",
+                                    min_value = 10, value = GOF_RESAMPLES, step = 50)
+        submit = st.button("Run Goodness-of-Fit Tests")
+
+        names = tuple(f.get_top(top, selection))
+        gof_request = ("gof",) + request + (names, resamples)
+        session = current_session_id()
+        result = SESSIONS.get(session, gof_request)
+        if result is None:
+            job = JOBS.find(session, gof_request)
+            if submit and not JOBS.reusable(job):
+                def run(job):
+                    return assess_fitter(f, top, selection, resamples = resamples,
+                                         max_workers = JOB_WORKERS,
+                                         progress = lambda done, total: job.update(
+                                             done / total, f"Bootstrap batch {done}/{total}"))
+                job = JOBS.submit(session, gof_request, run,
+                                  f"goodness of fit, {len(names)} distributions", gof_state)
+            if job is None:
+                return
+            result = wait_for_job(job, load_gof_state, tracer, st.empty())
+            if result is None:
+                return
+            SESSIONS.put(session, gof_request, result,
+                         nbytes = sum(int(t.memory_usage(deep = True).sum()) for t in result))
+
+        gof, intervals = result
+        st.write("Goodness of fit (p-values from the bootstrap resamples)")
+        st.dataframe(gof.set_index("dist_name"))
+        st.write("Parameter estimates with bootstrap standard errors and confidence intervals")
+        st.dataframe(intervals)
+        download_results(intervals.merge(gof, on = "dist_name"), "goodness_of_fit", gof_request,
+                         label = "Download Goodness of Fit")
+
+
+
+# Fit one distribution set to several columns as one background job and
+# show the best distribution per column
+def fit_columns_and_report(request, df, cols, dists, bins_input, selection, digest, budget, warm,
+                           tracer, submit, source):
+    from fit_engine import MultiColumnFitter
+    from job_queue import JOB_WORKERS
+
+    def build():
+        return MultiColumnFitter({col: df[col].values for col in cols}, dists, bins = bins_input,
+                                 max_workers = JOB_WORKERS, cache = get_fit_cache(), digest = digest,
+                                 registry = get_cost_registry(), warm_start = warm, tracer = tracer)
+
+    def record(f, job):
+        get_run_history().record(job.id, digest, source,
+                                 f"{len(cols)} columns x {len(dists)} distributions",
+                                 {"columns": list(cols), "distributions": list(dists), "bins": bins_input,
+                                  "criterion": selection, "budget": budget, "warm_start": warm},
+                                 f.results(selection))
+
+    status = st.empty()
+    table = st.empty()
+    f = session_fitter(request, build, budget, tracer, status, submit,
+                       f"{len(cols)} columns x {len(dists)} distributions", record = record)
+    if f is None:
+        return
+    for column_fitter in f.fitters.values():
+        column_fitter.tracer = tracer
+    if any(c.bins != bins_input for c in f.fitters.values()):
+        f.rebin(bins_input)
+    show_deferred({f"{col}: {name}": reason for (col, name), reason in f.deferred.items()})
+    if not any(c.fit_time for c in f.fitters.values()):
+        return
+
+    best = f.best_matrix(selection)
+    status.success(f"Best Distribution per Column Based on {selection} Sorting Criteria")
+    table.dataframe(best.drop(columns = ["params"]))
+    compressed = {col: round(c.compression_ratio, 1) for col, c in f.fitters.items() if c.is_compressed}
+    if compressed:
+        st.info(f"Weighted fitting on deduplicated values, compression ratio per column: {compressed}")
+    with st.beta_expander("Best Fitted Parameters per Column"):
+        st.write({row["column"]: {row["dist_name"]: row["params"]} for _, row in best.iterrows()})
+
+    with tracer.phase("download link"):
+        download_results(f.results(selection), "dist_summary", request + (bins_input, selection))
 
 
 
@@ -57,7 +557,7 @@ def main():
         st.header("Exploratory Data Analysis")
         data_file = load_data()
         if data_file is not None:
-            df = pd.read_csv(data_file)
+            digest, df = load_frame(data_file)
             st.write(f"The file contains {df.shape[0]} rows and {df.shape[1]} columns")
 
             submenu = st.sidebar.selectbox("Submenu",
@@ -65,16 +565,19 @@ def main():
 
             if submenu == "Descriptive Stats":
                 st.header("Descriptive Stats")
-                st.dataframe(df)
+                show_table(df)
 
                 with st.beta_expander("Data Types"):
                     st.dataframe(df.dtypes)
 
                 with st.beta_expander("Descriptive Summary"):
-                    st.dataframe(df.describe())
+                    from column_stats import describe
+                    st.write("Quantiles are approximate (within 1% relative error)")
+                    st.dataframe(describe(digest, df))
 
             else:
                 st.header("Visualization")
+                from eda import histogram_figure
                 with st.beta_expander("Histogram"):
 
                     col = st.selectbox("Select a Numeric Column", df.columns.to_list())
@@ -82,77 +585,64 @@ def main():
                                               min_value = 1,
                                               value = 10,
                                               step = 1)
-                    p1 = px.histogram(df, x = col, nbins = no_bins)
+                    p1 = histogram_figure(col, *column_histogram(digest, df, col, no_bins))
                     st.plotly_chart(p1)
 
     elif choice == "Distribution Fitting":
         st.header("Distribution Fitting")
         data_file = load_data()
         if data_file is not None:
-            df = pd.read_csv(data_file)
-            task = st.selectbox("Select Type of Distribution Fitting",
-                                ["Fit Common Distributions", "Fit Selected Distributions"])
+            from all_params import dist_list, dist_subsets
+            from fit_engine import resolve_distributions
+            from streaming import read_columns
+            from tracing import Tracer
+
+            budget = st.sidebar.number_input("Time Budget in Seconds (0 = no limit)",
+                                             min_value = 0,
+                                             value = 0,
+                                             step = 10)
+            warm = st.sidebar.checkbox("Warm-Start Fits from Data-Driven Initial Guesses", value = True)
+            timing = st.sidebar.checkbox("Show Timing Breakdown")
+            tracer = Tracer()
+            tasks = ["Fit Common Distributions", "Fit Selected Distributions"]
+            if st.sidebar.checkbox("Stream Large File (chunked reading, sampled fit)"):
+                with tracer.phase("read header"):
+                    digest, df = upload_digest(data_file), None
+                    columns = read_columns(data_file)
+            else:
+                with tracer.phase("read_csv"):
+                    digest, df = load_frame(data_file)
+                columns = df.columns.to_list()
+                tasks.append("Fit Multiple Columns")
+            task = st.selectbox("Select Type of Distribution Fitting", tasks)
 
             if task == "Fit Common Distributions":
-                col = st.selectbox("Select a Numeric Column", df.columns.to_list())
+                col = st.selectbox("Select a Numeric Column", columns)
                 bins_input = st.number_input("Insert Number of Bins",
                                              min_value = 1,
-                                             value = 100,
+                                             value = default_bins(digest, df, col),
                                              step = 1)
                 selection = st.selectbox("Selection Criteria",
                                          ["sumsquare_error", "aic", "bic"])
                 no_to_show = st.number_input("Number of Distributions to Show",
                                              min_value = 1,
-                                             max_value = len(get_common_distributions()),
+                                             max_value = len(resolve_distributions("common")),
                                              value = 5,
                                              step = 1)
 
 
-                if st.button("Process"):
-                    with st.spinner('Wait for it... ⏳'):
-                        time.sleep(5)
-                        with st.spinner('Almost done... 👏👏'):
-                            time.sleep(2)
-                            st.success(f"Top {no_to_show} Distributions Summary Based on {selection} Sorting Criteria")
-                            data = df[col].values
-                            f = Fitter(data, distributions = get_common_distributions(), bins = bins_input)
-                            fig, ax = plt.subplots()
-                            f.fit()
-                            st.dataframe(f.summary(method = selection,
-                                                   Nbest = no_to_show))
-                            st.success("Fitted Distribution Plot")
-                            st.pyplot(fig)
-                            download_csv(f.summary(method = selection,
-                                                   Nbest = len(get_common_distributions())).reset_index().rename(columns = {'index':'dist_name'}))
-
-                            st.success(f"Best Fitted Distribution Parameters")
-                            best_name = f.get_best(method = selection)
-                            key_name = list(best_name.keys())
-                            key_list = ' '.join([str(element) for element in key_name])
-
-                            # Joining parameters and values
-                            st.write(f"The {key_list} Distribution's Fitted Parameters Are:")
-                            tuple_val = f.get_best(method = selection)[key_list]
-                            for i in tuple_val:
-                                param_val.append(i)
-                            parm_key = search_parm(key_list)
-                            res = {parm_key[i]: param_val[i] for i in range(len(parm_key))}
-                            st.write(res)
-
-
-                            st.success(
-                                f"For More Information on {key_list} Distribution Parameters Visit Scipy Documentation")
-
-                            st.markdown(
-                                f"[Scipy's {key_list} Distribution Documentation Link](https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.{key_list}.html)",
-                                unsafe_allow_html = True)
+                dists = resolve_distributions("common")
+                fit_and_report(("fit", digest, col, df is None, tuple(dists), budget, warm),
+                               lambda: column_inputs(data_file, df, col, digest, tracer),
+                               dists, bins_input, selection, no_to_show, budget, warm, tracer,
+                               st.button("Process"), f"{data_file.name}: {col}")
 
-            else:
+            elif task == "Fit Selected Distributions":
                 dists = st.multiselect("Select One or More Distributions", dist_list)
-                col = st.selectbox("Select a Numeric Column", df.columns.to_list())
+                col = st.selectbox("Select a Numeric Column", columns)
                 bins_input = st.number_input("Insert Number of Bins",
                                              min_value = 1,
-                                             value = 100,
+                                             value = default_bins(digest, df, col),
                                              step = 1)
                 selection = st.selectbox("Selection Criteria",
                                          ["sumsquare_error", "aic", "bic"])
@@ -163,65 +653,44 @@ def main():
                                              step = 1)
 
 
-                if st.button("Process"):
-                    with st.spinner('Wait for it... ⏳'):
-                        time.sleep(5)
-                        with st.spinner('Almost done... 👏👏'):
-                            time.sleep(5)
-                            st.success(f"Top {no_to_show} Distributions Summary Based on {selection} Sorting Criteria")
-                            f = Fitter(df[col], distributions = dists, bins = bins_input)
-                            f.fit()
-                            fig, ax = plt.subplots()
-                            f.fit()
-                            st.dataframe(f.summary(method = selection,
-                                                   Nbest = no_to_show))
-                            st.success("Fitted Distribution Plot")
-                            st.pyplot(fig)
-                            download_csv(f.summary(method = selection,
-                                                   Nbest = len(dists)).reset_index().rename(columns = {'index':'dist_name'}))
-
-                            st.success(f"Best Fitted Distribution Parameters")
-                            best_name = f.get_best(method=selection)
-                            key_name = list(best_name.keys())
-                            key_list = ' '.join([str(element) for element in key_name])
-
-                            # Joining parameters and values
-                            st.write(f"The {key_list} Distribution's Fitted Parameters Are:")
-                            tuple_val = f.get_best(method = selection)[key_list]
-                            for i in tuple_val:
-                                param_val.append(i)
-                            parm_key = search_parm(key_list)
-                            res = {parm_key[i]: param_val[i] for i in range(len(parm_key))}
-                            st.write(res)
-
-                            st.success(
-                                f"For More Information on {key_list} Distribution Parameters Visit Scipy Documentation")
-
-                            if key_list == "frechet_l":
-                                st.markdown(
-                                    f"[Scipy's {key_list} Distribution Documentation Link](https://docs.scipy.org/doc/scipy-0.14.0/reference/generated/scipy.stats.frechet_l.html)",
-                                    unsafe_allow_html=True)
-
-                            elif key_list == "frechet_r":
-                                st.markdown(
-                                    f"[Scipy's {key_list} Distribution Documentation Link](https://docs.scipy.org/doc/scipy-0.14.0/reference/generated/scipy.stats.frechet_r.html)",
-                                    unsafe_allow_html=True)
-
-                            elif key_list == "reciprocal":
-                                st.markdown(
-                                    f"[Scipy's {key_list} Distribution Documentation Link](https://docs.scipy.org/doc/scipy-0.14.0/reference/generated/scipy.stats.reciprocal.html)",
-                                    unsafe_allow_html=True)
-
-                            else:
-                                st.markdown(
-                                    f"[Scipy's {key_list} Distribution Documentation Link](https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.{key_list}.html)",
-                                    unsafe_allow_html = True)
+                fit_and_report(("fit", digest, col, df is None, tuple(dists), budget, warm),
+                               lambda: column_inputs(data_file, df, col, digest, tracer),
+                               dists, bins_input, selection, no_to_show, budget, warm, tracer,
+                               st.button("Process"), f"{data_file.name}: {col}")
+
+            else:
+                numeric_cols = df.select_dtypes("number").columns.to_list()
+                cols = st.multiselect("Select Numeric Columns", numeric_cols, default = numeric_cols)
+                dist_set = st.selectbox("Select a Distribution Set",
+                                        ["common", "all"] + list(dist_subsets))
+                bins_input = st.number_input("Insert Number of Bins",
+                                             min_value = 1,
+                                             value = 100,
+                                             step = 1)
+                selection = st.selectbox("Selection Criteria",
+                                         ["sumsquare_error", "aic", "bic"])
+
+
+                dists = resolve_distributions(dist_set)
+                submit = st.button("Process")
+                if cols:
+                    fit_columns_and_report(("fit", digest, tuple(cols), tuple(dists), budget, warm),
+                                           df, cols, dists, bins_input, selection, digest, budget,
+                                           warm, tracer, submit, data_file.name)
+
+            show_jobs()
+            show_history()
+            if timing:
+                show_timing(tracer)
 
 
     else:
         st.header("About")
         st.markdown(about_text, unsafe_allow_html = True)
 
+    # After the page is out, load the fitting stack for later requests
+    preload_in_background()
+
 
 if __name__ == "__main__":
     main()
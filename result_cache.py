@@ -0,0 +1,89 @@
+# Persistent cache of fitted parameters
+#
+# Changing only the selection criterion, the number of distributions to show
+# or the number of bins does not change the MLE parameters, so they are
+# stored in SQLite keyed by (data digest, column, distribution) together with
+# the fit time and any failure. Timeouts are not stored, since they depend on
+# the time allowed rather than on the data. Errors, AIC and BIC are
+# recomputed from the parameters against the current histogram, and only
+# distributions missing from the cache are refitted. The least recently used rows are dropped once
+# the table exceeds FIT_RESULT_CACHE_ROWS.
+import json
+import os
+import sqlite3
+import time
+
+from data_cache import CACHE_DIR
+
+
+RESULT_CACHE_PATH = os.path.join(CACHE_DIR, "fit_results.sqlite")
+RESULT_CACHE_ROWS = int(os.environ.get("FIT_RESULT_CACHE_ROWS", 100000))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fitted_params (
+    digest TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    dist_name TEXT NOT NULL,
+    params TEXT,
+    fit_time REAL,
+    error TEXT,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (digest, column_name, dist_name)
+)
+"""
+
+
+class ResultCache(object):
+
+    def __init__(self, path = RESULT_CACHE_PATH, max_rows = RESULT_CACHE_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    # A short-lived connection per call keeps the cache safe to use from
+    # Streamlit's per-session script threads
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout = 30)
+
+    # Returns {dist_name: row dict} for the distributions already cached
+    def get_many(self, digest, column, dists):
+        dists = list(dists)
+        if not dists:
+            return {}
+        marks = ",".join("?" * len(dists))
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT * FROM fitted_params WHERE digest = ? AND column_name = ?"
+                " AND dist_name IN ({})".format(marks),
+                [digest, column] + dists).fetchall()
+            conn.execute(
+                "UPDATE fitted_params SET last_used = ? WHERE digest = ? AND column_name = ?"
+                " AND dist_name IN ({})".format(marks),
+                [time.time(), digest, column] + dists)
+        found = {}
+        for row in rows:
+            entry = dict(row)
+            params = entry.pop("params")
+            entry["params"] = tuple(json.loads(params)) if params is not None else None
+            found[entry["dist_name"]] = entry
+        return found
+
+    def put(self, digest, column, dist_name, params, fit_time, error = None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fitted_params VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, column, dist_name,
+                 json.dumps(list(params)) if params is not None else None,
+                 fit_time, error, time.time()))
+        self.evict()
+
+    def evict(self):
+        with self._connect() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM fitted_params").fetchone()[0]
+            if count > self.max_rows:
+                conn.execute(
+                    "DELETE FROM fitted_params WHERE rowid IN (SELECT rowid FROM fitted_params"
+                    " ORDER BY last_used LIMIT ?)", (count - self.max_rows,))
@@ -0,0 +1,100 @@
+# Local history of finished fit runs
+#
+# Every fit job that finishes on the fitting page is recorded here with its
+# source file, settings and full results table (errors, AIC, BIC, fit times
+# and named parameters), so past runs can be listed and downloaded again
+# without refitting, also after a server restart. Results are stored as
+# zlib-compressed JSON in SQLite next to the fit cache; the oldest runs are
+# dropped once there are more than FIT_RUN_HISTORY runs.
+#
+#   python run_history.py                     list the recorded runs
+#   python run_history.py RUN_ID out.csv      export a run (.csv, .json, .parquet)
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+
+import pandas as pd
+
+from data_cache import CACHE_DIR
+from export import export_bytes, write_file
+
+
+RUN_HISTORY_PATH = os.path.join(CACHE_DIR, "run_history.sqlite")
+RUN_HISTORY_RUNS = int(os.environ.get("FIT_RUN_HISTORY", 200))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    source TEXT,
+    digest TEXT,
+    description TEXT,
+    settings TEXT,
+    n_results INTEGER,
+    results BLOB
+)
+"""
+
+RUN_COLUMNS = ["run_id", "created", "source", "description", "n_results", "settings"]
+
+
+class RunHistory(object):
+
+    def __init__(self, path = RUN_HISTORY_PATH, max_runs = RUN_HISTORY_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    # A short-lived connection per call, as in result_cache.py
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout = 30)
+
+    # settings: JSON-compatible dict (distributions, bins, criterion, ...)
+    def record(self, run_id, digest, source, description, settings, results):
+        blob = zlib.compress(export_bytes(results, "json"))
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (run_id, time.time(), source, digest, description,
+                          json.dumps(settings, default = str), len(results), blob))
+        self.evict()
+        return run_id
+
+    # Newest first, without the results
+    def runs(self, limit = None):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT {} FROM runs ORDER BY created DESC LIMIT ?".format(
+                ", ".join(RUN_COLUMNS)), (limit if limit is not None else -1,)).fetchall()
+        frame = pd.DataFrame(rows, columns = RUN_COLUMNS)
+        frame["created"] = pd.to_datetime(frame["created"], unit = "s").dt.strftime("%Y-%m-%d %H:%M:%S")
+        return frame
+
+    # Results table of a run, None if it is not (or no longer) recorded
+    def load(self, run_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT results FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return pd.DataFrame(json.loads(zlib.decompress(row[0]).decode()))
+
+    def evict(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE run_id NOT IN"
+                         " (SELECT run_id FROM runs ORDER BY created DESC LIMIT ?)", (self.max_runs,))
+
+
+if __name__ == "__main__":
+    history = RunHistory()
+    if len(sys.argv) == 3:
+        results = history.load(sys.argv[1])
+        if results is None:
+            sys.exit("No recorded run {}".format(sys.argv[1]))
+        write_file(results, sys.argv[2])
+        print("Wrote {} rows to {}".format(len(results), sys.argv[2]))
+    else:
+        with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+            print(history.runs().drop(columns = ["settings"]).to_string(index = False))
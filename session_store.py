@@ -0,0 +1,137 @@
+# Bounded per-session state for the Streamlit server
+#
+# Streamlit reruns main.py for every widget change, so anything kept between
+# reruns has to live in an imported module, where it is shared by every
+# session of the server process. SessionStore keeps each session's values
+# (the parsed upload, finished fitters) apart, keyed by the session id from
+# the report context, and bounds them three ways:
+#   * a session holding more than FIT_SESSION_BYTES drops its least
+#     recently used values
+#   * sessions idle for FIT_SESSION_IDLE_SECONDS are dropped entirely
+#   * past FIT_SESSION_MEMORY_BYTES over all sessions, the least recently
+#     used values server-wide are dropped
+# Sizes are estimates (sizeof below). A dropped value is rebuilt on demand
+# from the on-disk caches, so eviction costs time, never results.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+
+SESSION_BYTES = int(os.environ.get("FIT_SESSION_BYTES", 256 * 1024 ** 2))
+SESSION_MEMORY_BYTES = int(os.environ.get("FIT_SESSION_MEMORY_BYTES", 1024 ** 3))
+SESSION_IDLE_SECONDS = float(os.environ.get("FIT_SESSION_IDLE_SECONDS", 1800))
+
+
+# Approximate memory held by a stored value (arrays and Series report their
+# nbytes). pandas is imported here, not at module top, because main.py
+# imports this module on every page.
+def sizeof(value):
+    import pandas as pd
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index = True, deep = True).sum())
+    return int(getattr(value, "nbytes", 0))
+
+
+# Session id of the script run on this thread, "default" outside streamlit run
+def current_session_id():
+    try:
+        from streamlit.report_thread import get_report_ctx
+        ctx = get_report_ctx()
+    except ImportError:
+        ctx = None
+    return ctx.session_id if ctx is not None else "default"
+
+
+class SessionStore(object):
+
+    def __init__(self, max_bytes = SESSION_MEMORY_BYTES, session_bytes = SESSION_BYTES,
+                 idle_seconds = SESSION_IDLE_SECONDS):
+        self.max_bytes = max_bytes
+        self.session_bytes = session_bytes
+        self.idle_seconds = idle_seconds
+        # {session_id: OrderedDict(key -> (value, nbytes, last_used))}, least
+        # recently used first
+        self._sessions = {}
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id, key):
+        with self._lock:
+            self._touch(session_id)
+            entries = self._sessions.get(session_id)
+            if entries is None or key not in entries:
+                return None
+            value, nbytes, _ = entries.pop(key)
+            entries[key] = (value, nbytes, time.time())
+            return value
+
+    # Values larger than the per-session limit are not kept
+    def put(self, session_id, key, value, nbytes = None):
+        nbytes = sizeof(value) if nbytes is None else nbytes
+        with self._lock:
+            self._touch(session_id)
+            entries = self._sessions.setdefault(session_id, OrderedDict())
+            entries.pop(key, None)
+            if nbytes > self.session_bytes:
+                return value
+            entries[key] = (value, nbytes, time.time())
+            self._trim_session(entries)
+            self._evict()
+        return value
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._last_seen.pop(session_id, None)
+
+    def nbytes(self, session_id = None):
+        with self._lock:
+            sessions = (self._sessions.values() if session_id is None
+                        else [self._sessions.get(session_id, {})])
+            return sum(nbytes for entries in sessions for _, nbytes, _ in entries.values())
+
+    # {session_id: {"values", "bytes", "idle_seconds"}}
+    def usage(self):
+        now = time.time()
+        with self._lock:
+            return {sid: {"values": len(entries),
+                          "bytes": sum(nbytes for _, nbytes, _ in entries.values()),
+                          "idle_seconds": now - self._last_seen.get(sid, now)}
+                    for sid, entries in self._sessions.items()}
+
+    def _touch(self, session_id):
+        self._last_seen[session_id] = time.time()
+        self._drop_idle()
+
+    def _drop_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        for sid in [sid for sid, seen in self._last_seen.items() if seen < cutoff]:
+            self._sessions.pop(sid, None)
+            del self._last_seen[sid]
+
+    def _trim_session(self, entries):
+        total = sum(nbytes for _, nbytes, _ in entries.values())
+        while total > self.session_bytes and entries:
+            _, (_, nbytes, _) = entries.popitem(last = False)
+            total -= nbytes
+
+    # Least recently used values server-wide until under max_bytes
+    def _evict(self):
+        total = sum(nbytes for entries in self._sessions.values() for _, nbytes, _ in entries.values())
+        if total <= self.max_bytes:
+            return
+        lru = sorted(((last_used, sid, key, nbytes)
+                      for sid, entries in self._sessions.items()
+                      for key, (_, nbytes, last_used) in entries.items()),
+                     key = lambda entry: entry[0])
+        for _, sid, key, nbytes in lru:
+            if total <= self.max_bytes:
+                break
+            del self._sessions[sid][key]
+            total -= nbytes
+
+
+# One store per server process
+SESSIONS = SessionStore()
@@ -7,3 +7,7 @@ enableCORS = false\n\
 headless = true\n\
 \n\
 " > ~/.streamlit/config.toml
+
+# Pre-import and pre-compile the fitting stack before the server starts
+# (set FIT_WARMUP=0 to skip)
+python warmup.py || true
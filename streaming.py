@@ -0,0 +1,110 @@
+# Out-of-core access to a single CSV column
+#
+# Reads the file in chunks and only parses the selected column, so memory
+# stays flat whatever the file size. The first pass counts values, tracks
+# the range and keeps a uniform random sample (bottom-k on random keys, which
+# is a reservoir sample that can be built one chunk at a time) for MLE
+# fitting, along with column_stats.ColumnStats over every row. Histograms for scoring are built over all rows with a second pass
+# per bin count.
+import os
+
+import numpy as np
+import pandas as pd
+
+from column_stats import ColumnStats
+
+
+CHUNK_ROWS = int(os.environ.get("FIT_CHUNK_ROWS", 500000))
+SAMPLE_SIZE = int(os.environ.get("FIT_SAMPLE_SIZE", 200000))
+
+
+def read_columns(data_file):
+    data_file.seek(0)
+    columns = pd.read_csv(data_file, nrows = 0).columns.to_list()
+    data_file.seek(0)
+    return columns
+
+
+class StreamingColumn(object):
+
+    def __init__(self, data_file, column, chunksize = CHUNK_ROWS,
+                 sample_size = SAMPLE_SIZE, seed = 0):
+        self.data_file = data_file
+        self.column = column
+        self.chunksize = chunksize
+        self.sample_size = sample_size
+        self.seed = seed
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.sample = None
+        self.stats = ColumnStats()
+        self._histograms = {}
+
+    # Finite values of the column, one chunk at a time. data_file is a file
+    # object or a path; a path is opened for each pass and marked as used,
+    # for caches trimmed by modification time.
+    def chunks(self):
+        if isinstance(self.data_file, str):
+            os.utime(self.data_file, None)
+        else:
+            self.data_file.seek(0)
+        reader = pd.read_csv(self.data_file, usecols = [self.column], chunksize = self.chunksize)
+        for chunk in reader:
+            values = pd.to_numeric(chunk[self.column], errors = "coerce").values.astype(float)
+            yield values[np.isfinite(values)]
+        if not isinstance(self.data_file, str):
+            self.data_file.seek(0)
+
+    # First pass: count, range, moments and quantile sketch, and a uniform
+    # sample of at most sample_size values
+    def scan(self):
+        rng = np.random.RandomState(self.seed)
+        sample = np.empty(0)
+        keys = np.empty(0)
+        for values in self.chunks():
+            if not len(values):
+                continue
+            self.n += len(values)
+            lo, hi = values.min(), values.max()
+            self.min = lo if self.min is None else min(self.min, lo)
+            self.max = hi if self.max is None else max(self.max, hi)
+            self.stats.update(values)
+
+            sample = np.concatenate([sample, values])
+            keys = np.concatenate([keys, rng.random_sample(len(values))])
+            if len(sample) > self.sample_size:
+                keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+                sample, keys = sample[keep], keys[keep]
+        self.sample = sample
+        return self
+
+    @property
+    def is_sampled(self):
+        return self.n > len(self.sample)
+
+    # Approximate memory held by the sample and the histograms
+    @property
+    def nbytes(self):
+        arrays = [self.sample] + [a for x, y, _ in self._histograms.values() for a in (x, y)]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    # Second pass: density histogram over every row. Returns (x, y, n) as
+    # expected by ParallelFitter's binner; empty when no value is numeric.
+    def histogram(self, bins):
+        if not self.n:
+            return np.zeros(0), np.zeros(0), 0
+        if bins not in self._histograms:
+            lo, hi = self.min, self.max
+            if lo == hi:
+                # Same convention as np.histogram for a constant column
+                lo, hi = lo - 0.5, hi + 0.5
+            edges = np.linspace(lo, hi, bins + 1)
+            counts = np.zeros(bins)
+            for values in self.chunks():
+                counts += np.histogram(values, bins = edges)[0]
+            widths = np.diff(edges)
+            y = counts / (counts.sum() * widths)
+            x = (edges[:-1] + edges[1:]) / 2.0
+            self._histograms[bins] = (x, y, self.n)
+        return self._histograms[bins]
@@ -0,0 +1,78 @@
+# One-pass moments and sketch quantiles against numpy and scipy
+import numpy as np
+import pytest
+import scipy.stats
+
+from column_stats import RELATIVE_ACCURACY, ColumnStats, QuantileSketch, suggested_bins
+
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    return np.concatenate([rng.lognormal(1.0, 0.8, 40000), -rng.gamma(2.0, size = 10000),
+                           np.zeros(100)])
+
+
+def chunked(values, size):
+    stats = ColumnStats()
+    for start in range(0, len(values), size):
+        stats.update(values[start:start + size])
+    return stats
+
+
+def test_moments_match_scipy(data):
+    stats = chunked(data, 7919)
+    assert stats.n == len(data)
+    assert stats.mean == pytest.approx(np.mean(data), rel = 1e-12)
+    assert stats.variance() == pytest.approx(np.var(data, ddof = 1), rel = 1e-10)
+    assert stats.skew == pytest.approx(scipy.stats.skew(data), rel = 1e-9)
+    assert stats.kurtosis == pytest.approx(scipy.stats.kurtosis(data), rel = 1e-9)
+    assert (stats.min, stats.max) == (data.min(), data.max())
+
+
+def test_merge_is_independent_of_chunking(data):
+    whole = ColumnStats().update(data)
+    merged = chunked(data[:1000], 333).merge(chunked(data[1000:], 10007))
+    for attr in ("n", "mean", "m2", "m3", "m4", "min", "max"):
+        assert getattr(merged, attr) == pytest.approx(getattr(whole, attr), rel = 1e-9)
+    assert merged.sketch.to_dict() == whole.sketch.to_dict()
+
+
+def test_non_finite_values_are_ignored():
+    stats = ColumnStats().update([1.0, np.nan, 3.0, np.inf])
+    assert stats.n == 2 and stats.mean == 2.0
+    assert ColumnStats().update([np.nan]).summary() is None
+
+
+@pytest.mark.parametrize("q", [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99])
+def test_sketch_quantiles_within_relative_accuracy(data, q):
+    sketch = QuantileSketch()
+    for start in range(0, len(data), 5000):
+        sketch.update(data[start:start + 5000])
+    # np.quantile with the "lower" method, which older numpy spells differently
+    expected = np.sort(data)[int(np.floor(q * (len(data) - 1)))]
+    assert abs(sketch.quantile(q) - expected) <= RELATIVE_ACCURACY * abs(expected) + 1e-12
+
+
+def test_sketch_round_trip(data):
+    sketch = QuantileSketch().update(data)
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    qs = np.linspace(0, 1, 11)
+    np.testing.assert_array_equal(restored.quantile(qs), sketch.quantile(qs))
+
+
+def test_stats_round_trip_and_describe(data):
+    stats = ColumnStats().update(data)
+    restored = ColumnStats.from_dict(stats.to_dict())
+    assert restored.summary() == stats.summary()
+    described = stats.describe()
+    assert described["count"] == len(data)
+    assert described["std"] == pytest.approx(np.std(data, ddof = 1), rel = 1e-10)
+
+
+def test_suggested_bins_freedman_diaconis():
+    values = np.random.RandomState(1).normal(size = 10000)
+    q25, q75 = np.quantile(values, [0.25, 0.75])
+    expected = np.ceil((values.max() - values.min()) / (2 * (q75 - q25) / len(values) ** (1 / 3.0)))
+    assert abs(suggested_bins(ColumnStats().update(values)) - expected) <= 0.05 * expected
+    assert suggested_bins(ColumnStats().update(np.ones(10))) == 100
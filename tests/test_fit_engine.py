@@ -0,0 +1,64 @@
+# Weighted fitting on deduplicated data against scipy on the expanded data
+import numpy as np
+import pytest
+import scipy.stats
+
+from fit_engine import _weighted_nnlf, histogram, score_all, weighted_fit
+
+
+@pytest.fixture
+def quantised():
+    data = np.round(np.random.RandomState(0).gamma(2.0, size = 5000), 1)
+    values, counts = np.unique(data, return_counts = True)
+    return data, values, counts
+
+
+@pytest.mark.parametrize("name, theta", [("gamma", (2.0, -0.1, 1.0)),
+                                         ("lognorm", (0.6, -0.2, 1.8)),
+                                         ("norm", (2.0, 1.4))])
+def test_weighted_nnlf_matches_expanded_nnlf(quantised, name, theta):
+    data, values, counts = quantised
+    dist = getattr(scipy.stats, name)
+    expected = dist.nnlf(theta, data)
+    assert _weighted_nnlf(np.array(theta), dist, values, counts) == pytest.approx(expected, rel = 1e-10)
+
+
+def test_weighted_nnlf_rejects_invalid_parameters(quantised):
+    _, values, counts = quantised
+    assert _weighted_nnlf(np.array([2.0, 0.0, -1.0]), scipy.stats.gamma, values, counts) == np.inf
+    assert _weighted_nnlf(np.array([-2.0, 0.0, 1.0]), scipy.stats.gamma, values, counts) == np.inf
+
+
+def test_weighted_fit_matches_expanded_fit(quantised):
+    data, values, counts = quantised
+    start = scipy.stats.norm.fit(data)
+    params = weighted_fit(scipy.stats.norm, values, counts, start = ((), start[0], start[1]))
+    # The normal MLE is the weighted mean and the weighted population std
+    mean = np.average(values, weights = counts)
+    std = np.sqrt(np.average((values - mean) ** 2, weights = counts))
+    np.testing.assert_allclose(params, [mean, std], rtol = 1e-3)
+    theta = weighted_fit(scipy.stats.gamma, values, counts)
+    expected = scipy.stats.gamma.fit(data)
+    np.testing.assert_allclose(theta, expected, rtol = 1e-3, atol = 1e-3)
+    assert (_weighted_nnlf(theta, scipy.stats.gamma, values, counts)
+            <= scipy.stats.gamma.nnlf(expected, data) * (1 + 1e-9))
+
+
+def test_weighted_histogram_matches_expanded_histogram(quantised):
+    data, values, counts = quantised
+    x, y = histogram(values, 30, weights = counts)
+    x_full, y_full = histogram(data, 30)
+    np.testing.assert_allclose(x, x_full)
+    np.testing.assert_allclose(y, y_full)
+
+
+def test_score_all_matches_per_distribution_scores(quantised):
+    data, _, _ = quantised
+    x, y = histogram(data, 50)
+    fitted = {"norm": scipy.stats.norm.fit(data), "gamma": scipy.stats.gamma.fit(data)}
+    pdfs, errors = score_all(fitted, x, y, len(data))
+    for name, params in fitted.items():
+        pdf = getattr(scipy.stats, name).pdf(x, *params)
+        np.testing.assert_allclose(pdfs[name], pdf)
+        assert errors.loc[name, "sumsquare_error"] == pytest.approx(np.sum((pdf - y) ** 2))
+        assert errors.loc[name, "kl_div"] == pytest.approx(scipy.stats.entropy(pdf, y))
@@ -0,0 +1,82 @@
+# KS and Anderson-Darling statistics against scipy and the textbook formulas
+import numpy as np
+import pytest
+import scipy.stats
+
+from goodness_of_fit import assess, data_grid, gof_statistics, observed_statistics
+
+
+def anderson_darling(data, dist, params):
+    x = np.sort(data)
+    n = len(x)
+    i = np.arange(1, n + 1)
+    cdf = dist.cdf(x, *params)
+    return -n - np.mean((2 * i - 1) * (np.log(cdf) + np.log(dist.sf(x[::-1], *params))))
+
+
+@pytest.fixture
+def data():
+    return np.random.RandomState(0).gamma(2.0, size = 2000)
+
+
+def test_statistics_match_scipy(data):
+    fitted = {"gamma": scipy.stats.gamma.fit(data), "norm": scipy.stats.norm.fit(data)}
+    observed = observed_statistics(data, None, fitted)
+    for name, params in fitted.items():
+        dist = getattr(scipy.stats, name)
+        ks, ad = observed[name]
+        assert ks == pytest.approx(scipy.stats.kstest(data, name, params).statistic, rel = 1e-12)
+        assert ad == pytest.approx(anderson_darling(data, dist, params), rel = 1e-10)
+
+
+# Newer scipy warns about its p-value method; only the statistic is compared
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_anderson_darling_matches_scipy_anderson_for_norm(data):
+    # scipy.stats.anderson estimates the normal scale with ddof = 1
+    params = (data.mean(), data.std(ddof = 1))
+    _, ad = observed_statistics(data, None, {"norm": params})["norm"]
+    assert ad == pytest.approx(scipy.stats.anderson(data, "norm").statistic, rel = 1e-8)
+
+
+def test_tie_weighted_statistics_match_expanded_data():
+    tied = np.round(np.random.RandomState(1).gamma(2.0, size = 3000), 1)
+    values, counts = np.unique(tied, return_counts = True)
+    params = scipy.stats.gamma.fit(tied)
+    weighted = observed_statistics(values, counts, {"gamma": params})["gamma"]
+    x = np.sort(tied)
+    expanded = gof_statistics(scipy.stats.gamma.cdf(x, *params)[None, :],
+                              scipy.stats.gamma.sf(x, *params)[None, :])
+    np.testing.assert_allclose(weighted, [expanded[0][0], expanded[1][0]], rtol = 1e-10)
+    assert weighted[0] == pytest.approx(scipy.stats.kstest(tied, "gamma", params).statistic)
+    assert weighted[1] == pytest.approx(anderson_darling(tied, scipy.stats.gamma, params))
+
+
+def test_data_grid():
+    assert data_grid(np.array([0.05, 0.15, 0.35, 1.05])) == pytest.approx((0.05, 0.1))
+    assert data_grid(np.array([0.0, 0.1, 0.25])) is None
+    assert data_grid(np.array([1.0])) is None
+
+
+def test_bootstrap_on_quantised_data_does_not_reject_the_true_family():
+    tied = np.round(np.random.RandomState(2).gamma(2.0, size = 2000), 1)
+    values, counts = np.unique(tied, return_counts = True)
+    fitted = {"gamma": scipy.stats.gamma.fit(tied), "norm": scipy.stats.norm.fit(tied)}
+    gof, intervals = assess(values, counts, fitted, resamples = 60, max_workers = 1)
+    gof = gof.set_index("dist_name")
+    assert gof.loc["gamma", "resolution"] == pytest.approx(0.1)
+    assert gof.loc["gamma", "ks_pvalue"] > 0.05
+    assert gof.loc["norm", "ad_pvalue"] < 0.05
+    assert list(intervals.loc[intervals["dist_name"] == "gamma", "param"]) == ["a", "loc", "scale"]
+    row = intervals[intervals["dist_name"] == "norm"].set_index("param").loc["scale"]
+    assert row["lower"] <= row["estimate"] <= row["upper"]
+
+
+def test_bootstrap_on_quantised_data_above_the_resample_size():
+    tied = np.round(np.random.RandomState(3).gamma(2.0, size = 20000), 1)
+    values, counts = np.unique(tied, return_counts = True)
+    fitted = {"gamma": scipy.stats.gamma.fit(tied), "norm": scipy.stats.norm.fit(tied)}
+    gof, _ = assess(values, counts, fitted, resamples = 60, max_workers = 1, max_sample = 2000)
+    gof = gof.set_index("dist_name")
+    assert gof.loc["gamma", "ks_pvalue"] > 0.05
+    assert gof.loc["gamma", "ad_pvalue"] > 0.05
+    assert gof.loc["norm", "ad_pvalue"] < 0.05
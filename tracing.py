@@ -0,0 +1,75 @@
+# Per-phase timing of a fit request
+#
+# A Tracer collects wall-clock spans: phases timed on the calling thread
+# (reading the upload, histograms, scoring, plotting, ...) and one span per
+# distribution fit, measured inside the worker process that ran it. Spans
+# use time.time() so worker and app timestamps line up on one timeline. The
+# spans can be summarised as a table or exported in the Chrome trace event
+# format (chrome://tracing, https://ui.perfetto.dev).
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+class Tracer(object):
+
+    # A disabled tracer accepts every call and records nothing
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def span(self, name, start, duration, category = "phase", pid = None, tid = None, args = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.spans.append({
+                "name": name, "category": category, "start": start, "duration": duration,
+                "pid": os.getpid() if pid is None else pid,
+                "tid": threading.get_ident() if tid is None else tid,
+                "args": args or {},
+            })
+
+    @contextmanager
+    def phase(self, name, **args):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.span(name, start, time.time() - start, args = args)
+
+    # One row per span name of a category: calls and inclusive seconds,
+    # slowest first
+    def breakdown(self, category = "phase"):
+        columns = ["name", "calls", "seconds", "mean_ms", "max_ms"]
+        spans = [s for s in self.spans if s["category"] == category]
+        if not spans:
+            return pd.DataFrame(columns = columns)
+        frame = pd.DataFrame(spans).groupby("name")["duration"].agg(["count", "sum", "mean", "max"])
+        frame = frame.reset_index().rename(columns = {"count": "calls", "sum": "seconds"})
+        frame["mean_ms"] = frame.pop("mean") * 1000.0
+        frame["max_ms"] = frame.pop("max") * 1000.0
+        return frame[columns].sort_values("seconds", ascending = False).reset_index(drop = True)
+
+    # Complete ("X") events in microseconds
+    def chrome_trace(self):
+        events = [{"name": s["name"], "cat": s["category"], "ph": "X",
+                   "ts": s["start"] * 1e6, "dur": s["duration"] * 1e6,
+                   "pid": s["pid"], "tid": s["tid"], "args": s["args"]}
+                  for s in self.spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_json(self):
+        return json.dumps(self.chrome_trace(), default = str)
+
+    def write(self, path):
+        with open(path, "w") as fh:
+            fh.write(self.to_json())
+
+
+# Shared by every fitter created without a tracer
+NULL_TRACER = Tracer(enabled = False)
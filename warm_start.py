@@ -0,0 +1,200 @@
+# Data-driven starting values for distribution fits
+#
+# scipy's rv_continuous.fit starts its optimiser from generic shape values,
+# so heavy shape families need many iterations or fail to converge. The
+# guesses here use method of moments or quantile matching for the shape
+# parameters and robust statistics for loc/scale, laid out like the
+# parameter lists in dist_parm_dict. Families without a rule return None and
+# keep scipy's default start.
+import numpy as np
+import pandas as pd
+from scipy.special import gamma as gamma_fn
+
+from all_params import dist_parm_dict
+
+
+# Summary statistics of (optionally count-weighted) data, computed once per
+# fit request and shared by every family; None for empty data
+def data_summary(values, counts = None):
+    values = np.asarray(values, dtype = float)
+    if not len(values):
+        return None
+    weights = np.ones(len(values)) if counts is None else np.asarray(counts, dtype = float)
+    if counts is None:
+        order = np.argsort(values)
+        values = values[order]
+    total = weights.sum()
+    mean = np.sum(weights * values) / total
+    var = np.sum(weights * (values - mean) ** 2) / total
+    std = np.sqrt(var)
+    skew = np.sum(weights * (values - mean) ** 3) / total / std ** 3 if std > 0 else 0.0
+
+    # values are sorted (np.unique output is sorted too)
+    cdf = np.cumsum(weights) / total
+    q25, median, q75 = [values[min(np.searchsorted(cdf, q), len(values) - 1)]
+                        for q in (0.25, 0.5, 0.75)]
+    return {"n": total, "mean": mean, "std": std, "skew": skew,
+            "min": values[0], "max": values[-1],
+            "median": median, "iqr": q75 - q25}
+
+
+def _robust_scale(s):
+    scale = s["iqr"] / 1.349
+    return scale if scale > 0 else (s["std"] if s["std"] > 0 else 1.0)
+
+
+# loc just below the sample minimum, for families supported on [loc, inf)
+def _lower_loc(s):
+    return s["min"] - 0.01 * max(s["max"] - s["min"], 1e-12)
+
+
+def _pearson_type(s):
+    # Three-moment match of a shifted gamma
+    skew = max(s["skew"], 0.1)
+    a = 4.0 / skew ** 2
+    scale = s["std"] * skew / 2.0
+    return (a,), s["mean"] - a * scale, scale
+
+
+def _erlang(s):
+    (a,), loc, scale = _pearson_type(s)
+    return (max(1.0, np.round(a)),), loc, scale
+
+
+def _weibull_shape(s, loc):
+    mean = s["mean"] - loc
+    cv = s["std"] / mean if mean > 0 else 1.0
+    return float(np.clip(cv ** -1.086, 0.1, 50.0))
+
+
+def _weibull_min(s):
+    loc = _lower_loc(s)
+    c = _weibull_shape(s, loc)
+    return (c,), loc, (s["mean"] - loc) / gamma_fn(1.0 + 1.0 / c)
+
+
+def _exponweib(s):
+    (c,), loc, scale = _weibull_min(s)
+    return (1.0, c), loc, scale
+
+
+def _lognorm(s):
+    loc = _lower_loc(s)
+    m = s["mean"] - loc
+    sigma2 = np.log1p((s["std"] / m) ** 2)
+    return (np.sqrt(sigma2),), loc, m * np.exp(-sigma2 / 2.0)
+
+
+def _gengamma(s):
+    (c,), loc, scale = _weibull_min(s)
+    return (1.0, c), loc, scale
+
+
+def _burr(s):
+    (c,), loc, scale = _weibull_min(s)
+    return (c, 1.0), loc, scale
+
+
+def _pearson3(s):
+    return (s["skew"],), s["mean"], s["std"]
+
+
+def _genextreme(s):
+    # Gumbel moments for loc/scale; scipy's c is 0 at the Gumbel skewness
+    # of 1.14 and grows as the right tail gets lighter
+    scale = s["std"] * np.sqrt(6.0) / np.pi
+    c = float(np.clip((1.1396 - s["skew"]) / 4.0, -0.5, 0.5))
+    return (c,), s["mean"] - 0.5772 * scale, scale
+
+
+def _johnsonsu(s):
+    # Quantile matching: centre on the median, skew sign sets a
+    a = -float(np.clip(s["skew"], -3.0, 3.0)) / 2.0
+    return (a, 1.5), s["median"], _robust_scale(s)
+
+
+def _t(s):
+    return (5.0,), s["median"], _robust_scale(s)
+
+
+def _gennorm(s):
+    return (2.0,), s["median"], s["std"] * np.sqrt(2.0) if s["std"] > 0 else 1.0
+
+
+_GUESSERS = {
+    "gamma":        _pearson_type,
+    "erlang":       _erlang,
+    "pearson3":     _pearson3,
+    "weibull_min":  _weibull_min,
+    "exponweib":    _exponweib,
+    "lognorm":      _lognorm,
+    "gengamma":     _gengamma,
+    "burr":         _burr,
+    "burr12":       _burr,
+    "genextreme":   _genextreme,
+    "johnsonsu":    _johnsonsu,
+    "t":            _t,
+    "gennorm":      _gennorm,
+}
+
+
+# Returns (shapes, loc, scale) or None to keep scipy's default start
+def initial_guess(dist_name, summary):
+    layout = dist_parm_dict.get(dist_name)
+    guesser = _GUESSERS.get(dist_name)
+    if layout is None or guesser is None or summary is None or summary["std"] <= 0:
+        return None
+    with np.errstate(all = "ignore"):
+        shapes, loc, scale = guesser(summary)
+    guess = tuple(float(v) for v in shapes) + (float(loc), float(scale))
+    if len(guess) != len(layout) or not np.all(np.isfinite(guess)) or scale <= 0:
+        return None
+    return tuple(guess[:-2]), guess[-2], guess[-1]
+
+
+# Iterations and time saved per freshly fitted distribution, measured
+# against the registry's runs without a warm start. Where there are none, the
+# reference pair recorded by ParallelFitter.fit_references for this data size
+# gives the iterations saved and the cold / warm time ratio.
+def savings_report(fitter, registry):
+    from cost_registry import size_bucket
+    names = [name for name in fitter.fit_info if name not in fitter.cached]
+    baseline = registry.baseline(names)
+    references = registry.references(names, size_bucket(fitter.n_obs))
+    n = len(fitter._data)
+    rows = []
+    for name in names:
+        info = fitter.fit_info[name]
+        fit_time = fitter.fit_time.get(name)
+        iterations = info.get("iterations")
+        base = baseline.get(name, {})
+        ref = references.get(name, {})
+        if base.get("cost_per_1000") is not None:
+            source = "runs without warm start"
+            base_time = base["cost_per_1000"] * n / 1000.0
+            base_iter = base.get("iterations")
+        elif ref and info.get("warm", False):
+            source = "reference fits on {} values".format(ref["n"])
+            base_time = (fit_time * ref["cold_seconds"] / ref["warm_seconds"]
+                         if ref["cold_seconds"] and ref["warm_seconds"] and fit_time is not None
+                         else None)
+            base_iter = (iterations + ref["cold_iterations"] - ref["warm_iterations"]
+                         if None not in (iterations, ref["cold_iterations"], ref["warm_iterations"])
+                         else None)
+        else:
+            source, base_time, base_iter = None, None, None
+        rows.append({
+            "dist_name": name,
+            "warm_start": info.get("warm", False),
+            "iterations": iterations,
+            "cold_iterations": base_iter,
+            "iterations_saved": base_iter - iterations
+            if base_iter is not None and iterations is not None else None,
+            "fit_time": fit_time,
+            "cold_fit_time": base_time,
+            "time_saved": base_time - fit_time if base_time is not None else None,
+            "baseline": source,
+        })
+    return pd.DataFrame(rows, columns = ["dist_name", "warm_start", "iterations", "cold_iterations",
+                                         "iterations_saved", "fit_time", "cold_fit_time", "time_saved",
+                                         "baseline"])
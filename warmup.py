@@ -0,0 +1,128 @@
+# Warm-up of the fitting stack, off the request path
+#
+# main.py imports the scientific libraries only on the pages that use them,
+# so Home and About render without pandas, scipy, matplotlib or plotly.
+#   * setup.sh runs this script once at boot (skipped with FIT_WARMUP=0): it
+#     byte-compiles the app modules, imports every page's libraries and runs
+#     a tiny fit, so .pyc files, matplotlib's font cache and the OS page
+#     cache are ready before the first session arrives.
+#   * preload_in_background() imports the same modules on a daemon thread of
+#     the Streamlit server once the first page has been rendered, so the
+#     first visit to a fitting page does not pay for them either.
+#   * python warmup.py --report [output.json] times the cold import of each
+#     page's modules, comparing the old import-everything layout with
+#     page-scoped imports.
+import compileall
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# What main.py imports at module top, needed by every page
+MAIN_MODULES = ["all_texts", "session_store", "warmup"]
+# Modules each page needs on top of streamlit
+PAGE_MODULES = {
+    "Home": MAIN_MODULES,
+    "About": MAIN_MODULES,
+    "Exploratory Data Analysis": MAIN_MODULES + ["data_cache", "eda", "column_stats",
+                                                 "plotly.graph_objects"],
+    "Distribution Fitting": MAIN_MODULES + ["all_params", "fit_engine", "data_cache",
+                                            "result_cache", "cost_registry", "warm_start",
+                                            "streaming", "column_stats", "tracing", "export",
+                                            "run_history", "goodness_of_fit", "job_queue",
+                                            "matplotlib.pyplot"],
+}
+# Everything the pages import, loaded by preload()
+ALL_MODULES = sorted(set(m for modules in PAGE_MODULES.values() for m in modules))
+# The module-top imports of main.py before imports were page-scoped, the
+# baseline of the startup report
+EAGER_MODULES = ["plotly.express", "matplotlib.pyplot", "pandas", "all_params", "all_texts",
+                 "fit_engine", "data_cache", "result_cache", "cost_registry", "warm_start",
+                 "streaming", "tracing"]
+
+_preloading = None
+
+
+# Best effort: a missing library fails on the page that needs it, not here
+def preload(modules = ALL_MODULES):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+# Once per server process
+def preload_in_background():
+    global _preloading
+    if _preloading is None:
+        _preloading = threading.Thread(target = preload, name = "fit-preload", daemon = True)
+        _preloading.start()
+    return _preloading
+
+
+def warm_up():
+    start = time.time()
+    compileall.compile_dir(ROOT, maxlevels = 0, quiet = 1)
+    import matplotlib
+    matplotlib.use("Agg")
+    preload()
+
+    # One small fit runs scipy's distribution setup and the scoring path
+    import numpy as np
+    from fit_engine import _fit_task, histogram, score_all
+    data = np.random.RandomState(0).gamma(2.0, size = 1000)
+    _, name, params, _, _, _ = _fit_task((None, "gamma", data, 30, None))
+    x, y = histogram(data, 50)
+    score_all({name: params}, x, y, len(data))
+    return time.time() - start
+
+
+# Seconds to import modules in a fresh interpreter, None if one is missing
+def import_time(modules):
+    code = ("import sys, time; sys.path.insert(0, {!r}); t = time.time()\n"
+            "try:\n    import streamlit\nexcept ImportError:\n    pass\n"
+            "{}\n"
+            "print(time.time() - t)").format(ROOT, "\n".join("import " + m for m in modules))
+    try:
+        out = subprocess.check_output([sys.executable, "-c", code], cwd = ROOT,
+                                      stderr = subprocess.DEVNULL)
+    except subprocess.CalledProcessError:
+        return None
+    return float(out.decode().strip().splitlines()[-1])
+
+
+# {page: {"eager": seconds, "lazy": seconds}}, median of repeat runs
+def startup_report(repeat = 3):
+    def median(modules):
+        times = [import_time(modules) for _ in range(repeat)]
+        times = sorted(t for t in times if t is not None)
+        return times[len(times) // 2] if times else None
+
+    eager = median(EAGER_MODULES)
+    return {page: {"eager": eager, "lazy": median(modules)} for page, modules in PAGE_MODULES.items()}
+
+
+def print_report(report):
+    fmt = lambda t: "n/a" if t is None else "{:.2f}s".format(t)
+    print("{:<28}{:>12}{:>12}".format("page", "eager", "lazy"))
+    for page, times in report.items():
+        print("{:<28}{:>12}{:>12}".format(page, fmt(times["eager"]), fmt(times["lazy"])))
+
+
+if __name__ == "__main__":
+    if "--report" in sys.argv[1:]:
+        report = startup_report()
+        print_report(report)
+        outputs = [arg for arg in sys.argv[1:] if arg.endswith(".json")]
+        if outputs:
+            with open(outputs[0], "w") as fh:
+                json.dump(report, fh, indent = 2)
+    elif os.environ.get("FIT_WARMUP", "1") != "0":
+        print("Warm-up finished in {:.1f}s".format(warm_up()))